@@ -2,7 +2,8 @@ import graphene
 from crm.schema import Query as CRMQuery, Mutation as CRMMutation
 
 class Query(CRMQuery, graphene.ObjectType):
-    pass
+    # Liveness check used by the crm.cron heartbeat
+    hello = graphene.String(default_value="Hello, GraphQL!")
 
 class Mutation(CRMMutation, graphene.ObjectType):
     pass
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db import connections
+
+# Rows per INSERT when a bulk mutation doesn't pass its own batch size
+DEFAULT_BULK_BATCH_SIZE = 500
+
+
+def bulk_batch_size(batch_size=None):
+    if batch_size:
+        return batch_size
+    return getattr(settings, "CRM_BULK_BATCH_SIZE", DEFAULT_BULK_BATCH_SIZE)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def lookup_in(queryset, field, values):
+    """Yield rows matching `field__in=values` in as few queries as the backend allows.
+
+    That's one query on backends without a bind parameter limit; SQLite
+    caps the number of parameters per statement, so it gets one per chunk.
+    """
+    values = list(values)
+    if not values:
+        return
+    connection = connections[queryset.db]
+    size = connection.ops.bulk_batch_size([field], values) or len(values)
+    for chunk in chunked(values, size):
+        yield from queryset.filter(**{f"{field}__in": chunk})
+
+
+def bulk_insert(model, objs, batch_size, returning=True):
+    """bulk_create in chunks; with `returning`, every object comes back with its pk."""
+    connection = connections[model.objects.db]
+    for chunk in chunked(objs, batch_size):
+        if not returning or connection.features.can_return_rows_from_bulk_insert:
+            model.objects.bulk_create(chunk)
+        else:
+            # e.g. MySQL can't return ids from a multi-row INSERT
+            for obj in chunk:
+                obj.save(force_insert=True)
+    return objs
@@ -0,0 +1,99 @@
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Customer, JobCheckpoint, Order
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLEANUP_BATCH_SIZE = 500
+# Seconds to pause between batches so other writers get the table back
+DEFAULT_CLEANUP_SLEEP = 0.1
+DEFAULT_INACTIVE_DAYS = 365
+
+# JobCheckpoint row holding the last pk an interrupted run deleted up to
+CHECKPOINT_NAME = "clean-inactive-customers"
+
+
+def inactive_customers(days=DEFAULT_INACTIVE_DAYS):
+    """Customers older than `days` who never placed an order."""
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    # The denormalized order_count finds candidates without touching orders
+    return Customer.objects.filter(created_at__lt=cutoff, order_count=0)
+
+
+def without_orders(customers):
+    return customers.exclude(Exists(Order.objects.filter(customer=OuterRef("pk"))))
+
+
+def clean_inactive_customers(
+    days=DEFAULT_INACTIVE_DAYS,
+    batch_size=None,
+    sleep=None,
+    dry_run=False,
+    resume=True,
+    progress=None,
+):
+    """Delete inactive customers in primary-key batches; returns how many matched.
+
+    Each batch is one short transaction, so the write lock is held for
+    `batch_size` rows at most, with `sleep` seconds between batches. The last
+    pk done is checkpointed in a JobCheckpoint row, so a rerun picks up
+    there unless `resume` is False. `dry_run` walks the same batches without
+    deleting. `progress(total, last_pk)` is called after every batch.
+    """
+    batch_size = batch_size or getattr(settings, "CRM_CLEANUP_BATCH_SIZE", DEFAULT_CLEANUP_BATCH_SIZE)
+    if sleep is None:
+        sleep = getattr(settings, "CRM_CLEANUP_SLEEP", DEFAULT_CLEANUP_SLEEP)
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+
+    last_pk = 0
+    if resume and not dry_run:
+        last_pk = (
+            JobCheckpoint.objects.filter(name=CHECKPOINT_NAME)
+            .values_list("position", flat=True)
+            .first()
+        ) or 0
+    if last_pk:
+        logger.info("Resuming inactive customer cleanup after pk %s", last_pk)
+
+    candidates = inactive_customers(days).order_by("pk")
+    total = 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        if dry_run:
+            total += without_orders(candidates.filter(pk__in=ids)).count()
+        else:
+            with transaction.atomic():
+                # Re-check against the orders themselves inside the transaction:
+                # a customer may have ordered since, or order_count may have drifted
+                _, deleted = without_orders(candidates.filter(pk__in=ids)).delete()
+                # Committed with the batch, so the checkpoint never runs ahead of it
+                JobCheckpoint.objects.update_or_create(
+                    name=CHECKPOINT_NAME, defaults={"position": ids[-1]}
+                )
+            total += deleted.get(Customer._meta.label, 0)
+        last_pk = ids[-1]
+
+        logger.info(
+            "%s %s inactive customers (up to pk %s)",
+            "Would delete" if dry_run else "Deleted", total, last_pk,
+        )
+        if progress:
+            progress(total, last_pk)
+        if len(ids) < batch_size:
+            break
+        if sleep:
+            time.sleep(sleep)
+
+    if not dry_run:
+        JobCheckpoint.objects.filter(name=CHECKPOINT_NAME).delete()
+    return total
@@ -0,0 +1,157 @@
+from django.conf import settings
+from graphene_django import settings as graphene_django_settings
+from graphql import GraphQLError
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from graphql.type import get_named_type, is_leaf_type, is_list_type, get_nullable_type
+from graphql.utilities import value_from_ast_untyped
+from graphql.validation import ValidationRule
+
+# Fits the dashboard page of user-001, allOrders(first: 100) with each
+# order's customer, product and products (cost 20502), while a second nested
+# connection level (100 x 100 x 100 rows) stays far over it
+DEFAULT_MAX_COST = 25000
+DEFAULT_MAX_DEPTH = 12
+
+# "Type.field" -> cost of resolving the field once. Leaf fields default to 0
+# and object/connection fields to 1; these are the ones that cost more.
+FIELD_WEIGHTS = {
+    "Query.allCustomers": 1,
+    "Query.allProducts": 1,
+    # A pk__in subquery when filtering on products
+    "Query.allOrders": 2,
+    "OrderType.customer": 1,
+    "OrderType.products": 1,
+    "OrderType.product": 1,
+    "OrderType.items": 1,
+    "CustomerType.orders": 1,
+    # Goes through the M2M table
+    "ProductType.orders": 2,
+    # A COUNT(*) over the filtered queryset
+    "CustomerTypeConnection.totalCount": 5,
+    "ProductTypeConnection.totalCount": 5,
+    "OrderTypeConnection.totalCount": 10,
+    # One aggregate pass over the filtered orders, and a GROUP BY for the top list
+    "Query.crmStats": 10,
+    "CrmStatsType.topProducts": 10,
+    # Reads the daily rollup tables
+    "Query.crmReport": 5,
+    "CrmReportType.topProducts": 5,
+    # A ranked full-text index match
+    "Query.search": 5,
+    "Mutation.createCustomer": 10,
+    "Mutation.createProduct": 10,
+    "Mutation.createOrder": 10,
+    "Mutation.bulkCreateCustomers": 50,
+    "Mutation.bulkCreateOrders": 50,
+    "Mutation.updateLowStockProducts": 50,
+    "Mutation.markOrdersReminded": 10,
+}
+
+
+def default_page_size():
+    """Rows a connection without first/last returns, and what the cost assumes for it.
+
+    graphene-django's nested connections already cap at this limit;
+    CRMConnectionField applies it to the top-level ones.
+    """
+    # Through the module: override_settings(GRAPHENE=...) replaces the object
+    return graphene_django_settings.graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+
+
+def complexity_settings():
+    weights = {**FIELD_WEIGHTS, **getattr(settings, "CRM_GRAPHQL_FIELD_WEIGHTS", {})}
+    return (
+        getattr(settings, "CRM_GRAPHQL_MAX_COST", DEFAULT_MAX_COST),
+        getattr(settings, "CRM_GRAPHQL_MAX_DEPTH", DEFAULT_MAX_DEPTH),
+        default_page_size(),
+        weights,
+    )
+
+
+def complexity_rule(variables=None, report=None):
+    """Build a validation rule that rejects operations over the cost/depth budget.
+
+    `variables` resolve `first: $n` style arguments; the highest cost and depth
+    seen are written to `report` so the view can return them in extensions.
+    """
+    variables = variables or {}
+    report = report if report is not None else {}
+    max_cost, max_depth, list_size, weights = complexity_settings()
+
+    class QueryComplexityRule(ValidationRule):
+        def enter_operation_definition(self, node, *args):
+            root_type = self.context.schema.get_root_type(node.operation)
+            if root_type is None:
+                return
+            self.depth = 0
+            self.visiting = set()
+            cost = self.selection_cost(node.selection_set, root_type, 1)
+            report["cost"] = max(report.get("cost", 0), cost)
+            report["depth"] = max(report.get("depth", 0), self.depth)
+
+            if self.depth > max_depth:
+                self.report_error(GraphQLError(
+                    f"Query depth {self.depth} exceeds the maximum of {max_depth}.", node
+                ))
+            if cost > max_cost:
+                self.report_error(GraphQLError(
+                    f"Query cost {cost} exceeds the maximum of {max_cost}.", node
+                ))
+
+        def page_size(self, node, field):
+            for argument in node.arguments:
+                if argument.name.value in ("first", "last"):
+                    value = value_from_ast_untyped(argument.value, variables)
+                    if isinstance(value, int):
+                        # first: 0 or a negative value must not cancel out the subtree
+                        return max(value, 1)
+            if "first" in field.args or is_list_type(get_nullable_type(field.type)):
+                return list_size
+            return 1
+
+        def selection_cost(self, selection_set, parent_type, depth):
+            total = 0
+            for selection in selection_set.selections:
+                if isinstance(selection, FieldNode):
+                    total += self.field_cost(selection, parent_type, depth)
+                elif isinstance(selection, InlineFragmentNode):
+                    fragment_type = parent_type
+                    if selection.type_condition:
+                        fragment_type = self.context.schema.get_type(
+                            selection.type_condition.name.value
+                        )
+                    total += self.selection_cost(selection.selection_set, fragment_type, depth)
+                elif isinstance(selection, FragmentSpreadNode):
+                    name = selection.name.value
+                    fragment = self.context.get_fragment(name)
+                    # Fragment cycles are reported by NoFragmentCyclesRule
+                    if fragment is None or name in self.visiting:
+                        continue
+                    self.visiting.add(name)
+                    fragment_type = self.context.schema.get_type(
+                        fragment.type_condition.name.value
+                    )
+                    total += self.selection_cost(fragment.selection_set, fragment_type, depth)
+                    self.visiting.discard(name)
+            return total
+
+        def field_cost(self, node, parent_type, depth):
+            name = node.name.value
+            fields = getattr(parent_type, "fields", {})
+            if name.startswith("__") or name not in fields:
+                # Introspection, or an unknown field another rule will report
+                return 0
+            self.depth = max(self.depth, depth)
+            field = fields[name]
+            field_type = get_named_type(field.type)
+            weight = weights.get(f"{parent_type.name}.{name}", 0 if is_leaf_type(field_type) else 1)
+            if node.selection_set is None:
+                return weight
+
+            children = self.selection_cost(node.selection_set, field_type, depth + 1)
+            # `edges` is the list inside a connection that was already multiplied
+            if parent_type.name.endswith("Connection") and name == "edges":
+                return weight + children
+            return weight + self.page_size(node, field) * children
+
+    return QueryComplexityRule
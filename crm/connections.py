@@ -0,0 +1,138 @@
+from functools import partial
+
+import graphene
+from django.db.models import QuerySet
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphql_relay import (
+    connection_from_array_slice,
+    get_offset_with_default,
+    offset_to_cursor,
+)
+
+from .complexity import default_page_size
+from .counting import CACHED, ESTIMATED, EXACT, count_queryset
+from .loaders import get_loaders
+from .models import Order
+from .optimizer import collect_fields
+from .pagination import keyset_connection
+
+
+# ---------------- Connection type ----------------
+class CountStrategy(graphene.Enum):
+    EXACT = EXACT
+    CACHED = CACHED
+    ESTIMATED = ESTIMATED
+
+
+class CRMConnection(graphene.relay.Connection):
+    """Relay connection with a `totalCount` the client can make cheaper."""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int(
+        strategy=CountStrategy(default_value=CountStrategy.EXACT.value)
+    )
+
+    def resolve_total_count(self, info, strategy=EXACT):
+        strategy = getattr(strategy, "value", strategy)
+        length = getattr(self, "length", None)
+        if strategy == EXACT and length is not None:
+            return length
+        return count_queryset(self.iterable, strategy)
+
+
+# ---------------- Connection fields ----------------
+class CRMConnectionField(graphene.relay.ConnectionField):
+    """Relay connection field that primes the request loaders with each page.
+
+    Passing `keyset: true` switches a queryset connection from offset cursors
+    to seek cursors over its `order_by` columns plus the primary key.
+    """
+
+    def __init__(self, type_, *args, **kwargs):
+        kwargs.setdefault("keyset", graphene.Boolean(default_value=False))
+        super().__init__(type_, *args, **kwargs)
+
+    @classmethod
+    def resolve_connection(cls, connection_type, args, resolved):
+        if not isinstance(resolved, QuerySet):
+            return super().resolve_connection(connection_type, args, resolved)
+        if not args.get("keyset") and args.get("first") is None and args.get("last") is None:
+            # Unpaged reads get the page the cost rule priced them at, not every row
+            args = {**args, "first": default_page_size()}
+        if args.get("keyset"):
+            connection = keyset_connection(connection_type, args, resolved)
+        elif args.get("last") is None and args.get("before") is None:
+            connection = cls.forward_connection(connection_type, args, resolved)
+        else:
+            # Paging backwards needs the total to locate the end, so COUNT it
+            # and let the slice become a LIMIT/OFFSET (graphene's default
+            # calls len(), which loads and prefetches every matching row).
+            length = resolved.count()
+            connection = connection_from_array_slice(
+                resolved,
+                args,
+                slice_start=0,
+                array_length=length,
+                array_slice_length=length,
+                connection_type=partial(connection_adapter, connection_type),
+                edge_type=connection_type.Edge,
+                page_info_type=page_info_adapter,
+            )
+            connection.length = length
+        connection.iterable = resolved
+        return connection
+
+    @staticmethod
+    def forward_connection(connection_type, args, queryset):
+        """Offset page read with one LIMIT first+1 query and no COUNT."""
+        start = get_offset_with_default(args.get("after"), -1) + 1
+        first = args.get("first")
+        if first is not None and first < 0:
+            raise ValueError("Argument 'first' must be a non-negative integer.")
+
+        if first is None:
+            rows = list(queryset[start:])
+        else:
+            rows = list(queryset[start:start + first + 1])
+        has_next = first is not None and len(rows) > first
+        rows = rows[:first]
+
+        edges = [
+            connection_type.Edge(node=row, cursor=offset_to_cursor(start + index))
+            for index, row in enumerate(rows)
+        ]
+        return connection_adapter(
+            connection_type,
+            edges=edges,
+            pageInfo=page_info_adapter(
+                startCursor=edges[0].cursor if edges else None,
+                endCursor=edges[-1].cursor if edges else None,
+                hasPreviousPage=False,
+                hasNextPage=has_next,
+            ),
+        )
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection_type, root, info, **args):
+        selected = collect_fields(info.field_nodes, info)
+        if "edges" not in selected and "pageInfo" not in selected:
+            # Only totalCount was asked for: don't read a page nobody sees
+            if isinstance(connection_type, graphene.NonNull):
+                connection_type = connection_type.of_type
+            connection = connection_adapter(
+                connection_type,
+                edges=[],
+                pageInfo=page_info_adapter(None, None, False, False),
+            )
+            connection.iterable = resolver(root, info, **args)
+            return connection
+
+        connection = super().connection_resolver(
+            resolver, connection_type, root, info, **args
+        )
+        nodes = [edge.node for edge in connection.edges]
+        if nodes and isinstance(nodes[0], Order):
+            get_loaders(info).prime_orders(nodes)
+        return connection
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.db.models import QuerySet
+
+EXACT = "exact"
+CACHED = "cached"
+ESTIMATED = "estimated"
+
+# Seconds a cached count stays valid if no save invalidates it first
+DEFAULT_COUNT_CACHE_TTL = 60
+
+
+def cache_is_shared():
+    """Whether every worker sees the same default cache.
+
+    Per-process backends can't see another worker's version bumps, so the
+    response and entity caches stay off on them. CRM_SHARED_CACHE overrides
+    the guess, e.g. for a single-process deployment.
+    """
+    shared = getattr(settings, "CRM_SHARED_CACHE", None)
+    if shared is None:
+        shared = not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+    return shared
+
+
+# ---------------- Model versions (cache invalidation) ----------------
+def _version_key(model):
+    return f"crm:count-version:{model._meta.label_lower}"
+
+
+def _version_seed():
+    # Versions restart from the clock, not 1, when their key is evicted, so
+    # they never come back to a value that old cache entries were keyed on
+    return time.time_ns()
+
+
+def model_version(model):
+    return cache.get_or_set(_version_key(model), _version_seed, None)
+
+
+def bump_model_version(model):
+    try:
+        cache.incr(_version_key(model))
+    except ValueError:
+        cache.set(_version_key(model), _version_seed(), None)
+
+
+def touched_models(queryset):
+    """Models whose tables appear in the queryset's FROM/JOIN clauses."""
+    by_table = {
+        model._meta.db_table: model
+        for model in apps.get_models(include_auto_created=True)
+    }
+    models = {queryset.model}
+    for alias in queryset.query.alias_map.values():
+        if alias.table_name in by_table:
+            models.add(by_table[alias.table_name])
+    return sorted(models, key=lambda model: model._meta.label_lower)
+
+
+# ---------------- Strategies ----------------
+def cached_count(queryset):
+    # Ordering never changes a count, so drop it to share entries across orderBy
+    queryset = queryset.order_by()
+    sql, params = queryset.query.sql_with_params()
+    versions = ",".join(
+        f"{model._meta.label_lower}@{model_version(model)}"
+        for model in touched_models(queryset)
+    )
+    digest = hashlib.md5(f"{sql}|{params!r}|{versions}".encode()).hexdigest()
+    key = f"crm:count:{queryset.db}:{digest}"
+
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        ttl = getattr(settings, "CRM_COUNT_CACHE_TTL", DEFAULT_COUNT_CACHE_TTL)
+        cache.set(key, count, ttl)
+    return count
+
+
+def estimated_count(queryset):
+    """Row estimate from the query planner, or None if the backend has none."""
+    connection = connections[queryset.db]
+    sql, params = queryset.order_by().query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        if connection.vendor == "mysql":
+            cursor.execute(f"EXPLAIN {sql}", params)
+            columns = [column[0] for column in cursor.description]
+            return int(dict(zip(columns, cursor.fetchone()))["rows"])
+    return None
+
+
+def count_queryset(queryset, strategy=EXACT):
+    if not isinstance(queryset, QuerySet):
+        return len(queryset)
+    if strategy == CACHED:
+        return cached_count(queryset)
+    if strategy == ESTIMATED:
+        estimate = estimated_count(queryset)
+        if estimate is not None:
+            return estimate
+    return queryset.count()
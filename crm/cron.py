@@ -1,7 +1,20 @@
 import datetime
-import asyncio
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+
+from .local import execute_local
+
+HEARTBEAT_QUERY = "{ hello }"
+
+LOW_STOCK_MUTATION = """
+mutation {
+    updateLowStockProducts {
+        success
+        updatedProducts {
+            name
+            stock
+        }
+    }
+}
+"""
 
 
 def log_crm_heartbeat():
@@ -12,17 +25,9 @@ def log_crm_heartbeat():
     with open("/tmp/crm_heartbeat_log.txt", "a") as f:
         f.write(message + "\n")
 
-    # Optional: check GraphQL hello query using gql
+    # Optional: check the GraphQL hello query, executed in-process
     try:
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql", verify=True, retries=3
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-
-        query = gql("{ hello }")
-
-        # gql client is async, so we wrap in asyncio
-        result = asyncio.run(client.execute_async(query))
+        result = execute_local(HEARTBEAT_QUERY)
         hello_value = result.get("hello", "No response")
 
         with open("/tmp/crm_heartbeat_log.txt", "a") as f:
@@ -37,29 +42,8 @@ def update_low_stock():
     now = datetime.datetime.now().strftime("%d/%m/%Y-%H:%M:%S")
 
     try:
-        # Set up gql client
-        transport = RequestsHTTPTransport(
-            url="http://localhost:8000/graphql", verify=True, retries=3
-        )
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-
-        # Define mutation
-        mutation = gql(
-            """
-            mutation {
-                updateLowStockProducts {
-                    success
-                    updatedProducts {
-                        name
-                        stock
-                    }
-                }
-            }
-            """
-        )
-
-        # Execute mutation
-        result = asyncio.run(client.execute_async(mutation))
+        # Execute mutation in-process (no HTTP round trip or introspection)
+        result = execute_local(LOW_STOCK_MUTATION)
         data = result.get("updateLowStockProducts", {})
         updated_products = data.get("updatedProducts", [])
 
@@ -2,46 +2,81 @@
 
 import sys
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from gql import Client, gql
 from gql.transport.aiohttp import AIOHTTPTransport
 
-async def fetch_pending_orders():
-    # GraphQL endpoint
-    transport = AIOHTTPTransport(url="http://localhost:8000/graphql")
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-
-    # Calculate date range (last 7 days)
-    seven_days_ago = (datetime.now() - timedelta(days=7)).date().isoformat()
+# Orders per page; each page is marked reminded before the next one is fetched
+PAGE_SIZE = 100
 
-    # GraphQL query
-    query = gql(
-        """
-        query GetRecentOrders($since: Date!) {
-            orders(orderDate_Gte: $since, status: "PENDING") {
+# Only pending orders without a reminder yet, so a run never rereads the
+# orders earlier runs handled (served by the crm_order_unreminded_idx index)
+PENDING_ORDERS_QUERY = """
+query GetPendingOrders($since: DateTime!, $first: Int!) {
+    allOrders(
+        filter: {status: PENDING, reminded: false, orderDateGte: $since}
+        orderBy: ["order_date", "id"]
+        first: $first
+    ) {
+        edges {
+            node {
                 id
                 customer {
                     email
                 }
             }
         }
-        """
-    )
+    }
+}
+"""
+
+MARK_REMINDED_MUTATION = """
+mutation MarkReminded($ids: [ID!]!) {
+    markOrdersReminded(orderIds: $ids) {
+        updatedCount
+    }
+}
+"""
+
+
+async def fetch_pending_orders():
+    # GraphQL endpoint; the documents above are fixed, so skip schema introspection
+    transport = AIOHTTPTransport(url="http://localhost:8000/graphql")
+    client = Client(transport=transport, fetch_schema_from_transport=False)
+
+    # Calculate date range (last 7 days)
+    seven_days_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
 
-    variables = {"since": seven_days_ago}
+    query = gql(PENDING_ORDERS_QUERY)
+    mark_reminded = gql(MARK_REMINDED_MUTATION)
 
     try:
-        result = await client.execute_async(query, variable_values=variables)
-        orders = result.get("orders", [])
-
-        # Log orders
-        with open("/tmp/order_reminders_log.txt", "a") as log_file:
-            for order in orders:
-                log_file.write(
-                    f"{datetime.now()}: Order {order['id']} -> {order['customer']['email']}\n"
+        total = 0
+        async with client as session:
+            while True:
+                result = await session.execute(
+                    query, variable_values={"since": seven_days_ago, "first": PAGE_SIZE}
+                )
+                orders = [edge["node"] for edge in result["allOrders"]["edges"]]
+                if not orders:
+                    break
+
+                # Log orders
+                with open("/tmp/order_reminders_log.txt", "a") as log_file:
+                    for order in orders:
+                        log_file.write(
+                            f"{datetime.now()}: Order {order['id']} -> {order['customer']['email']}\n"
+                        )
+
+                marked = await session.execute(
+                    mark_reminded, variable_values={"ids": [order["id"] for order in orders]}
                 )
+                total += len(orders)
+                # Stop on a short page, or if nothing got marked (it would come back again)
+                if len(orders) < PAGE_SIZE or not marked["markOrdersReminded"]["updatedCount"]:
+                    break
 
-        print("Order reminders processed!")
+        print(f"Order reminders processed! ({total} orders)")
 
     except Exception as e:
         sys.stderr.write(f"Error fetching orders: {e}\n")
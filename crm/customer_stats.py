@@ -0,0 +1,99 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .counting import bump_model_version
+from .entity_cache import invalidate_entities
+from .models import Customer, Order
+
+DEFAULT_STATS_REPAIR_BATCH_SIZE = 1000
+
+STATS_FIELDS = ("order_count", "lifetime_value", "last_order_at")
+# Order fields a save can change the stats through (update_fields may use either name)
+STATS_SOURCE_FIELDS = frozenset({"customer", "customer_id", "total_amount", "order_date"})
+
+
+def record_orders(orders):
+    """Add new orders to their customers' order_count/lifetime_value/last_order_at.
+
+    crm.signals calls this when an order is saved for the first time; bulk
+    writers, which skip post_save, call it inside the transaction that
+    inserts the orders. Each customer gets one UPDATE of relative increments
+    (in pk order, so concurrent writers lock rows in the same order), so
+    concurrent orders never overwrite each other's counts.
+    """
+    totals = defaultdict(lambda: [0, Decimal("0"), None])
+    for order in orders:
+        entry = totals[order.customer_id]
+        entry[0] += 1
+        entry[1] += Decimal(order.total_amount)
+        if entry[2] is None or order.order_date > entry[2]:
+            entry[2] = order.order_date
+
+    for customer_id in sorted(totals):
+        count, value, latest = totals[customer_id]
+        latest = Value(latest)
+        Customer.objects.filter(pk=customer_id).update(
+            order_count=F("order_count") + count,
+            lifetime_value=F("lifetime_value") + value,
+            # GREATEST is NULL on SQLite when either side is, Postgres skips NULLs
+            last_order_at=Coalesce(Greatest("last_order_at", latest), latest),
+        )
+    customers_changed(totals)
+
+
+def recompute_stats(customer_ids):
+    """Recompute the stats of `customer_ids` from their orders, in one UPDATE."""
+    orders = Order.objects.filter(customer=OuterRef("pk")).order_by().values("customer")
+    Customer.objects.filter(pk__in=customer_ids).update(
+        order_count=Coalesce(Subquery(orders.annotate(n=Count("pk")).values("n")), 0),
+        lifetime_value=Coalesce(
+            Subquery(orders.annotate(v=Sum("total_amount")).values("v")),
+            Value(Decimal("0")),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        last_order_at=Subquery(orders.annotate(at=Max("order_date")).values("at")),
+    )
+    customers_changed(customer_ids)
+
+
+def customers_changed(customer_ids):
+    # update() skips post_save: invalidate what the signals would have
+    bump_model_version(Customer)
+    invalidate_entities(Customer, customer_ids)
+
+
+def repair_stats(batch_size=None, progress=None):
+    """Recompute every customer's stats in pk batches; returns how many were done.
+
+    Each batch is its own short transaction. For drift from writes that
+    skip crm.signals (raw SQL, update() of an order's total or customer).
+    """
+    batch_size = batch_size or getattr(
+        settings, "CRM_STATS_REPAIR_BATCH_SIZE", DEFAULT_STATS_REPAIR_BATCH_SIZE
+    )
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    last_pk = 0
+    total = 0
+    while True:
+        ids = list(
+            Customer.objects.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            recompute_stats(ids)
+        total += len(ids)
+        last_pk = ids[-1]
+        if progress:
+            progress(total, last_pk)
+        if len(ids) < batch_size:
+            break
+    return total
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import parse
+from graphql.validation import specified_rules, validate
+
+# Total query text (in characters) the cache may hold before evicting
+DEFAULT_MAX_SIZE = 4 * 1024 * 1024
+
+
+class DocumentCache:
+    """LRU of (parsed DocumentNode, validation errors) keyed on query text and schema.
+
+    Entries are weighed by the length of their query text, which tracks the
+    size of the AST closely enough to bound memory.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_size(self):
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, "CRM_GRAPHQL_DOCUMENT_CACHE_SIZE", DEFAULT_MAX_SIZE)
+
+    def get(self, schema, query):
+        """Return (document, errors), parsing and validating only on a miss.
+
+        Parse errors propagate like graphql-core's own `parse` and are not cached.
+        """
+        key = (id(schema), query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        document = parse(query)
+        errors = validate(
+            schema, document, specified_rules, graphene_settings.MAX_VALIDATION_ERRORS
+        )
+        entry = (document, errors)
+
+        if len(query) <= self.max_size:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = entry
+                    self.size += len(query)
+                while self.size > self.max_size:
+                    (_, old_query), _ = self._entries.popitem(last=False)
+                    self.size -= len(old_query)
+                    self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_size": self.max_size,
+            }
+
+
+document_cache = DocumentCache()
@@ -0,0 +1,105 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+from .counting import cache_is_shared
+
+# Seconds a cached object lives if nothing invalidates it first; 0 disables.
+# Only used with a shared cache, see counting.cache_is_shared()
+DEFAULT_ENTITY_CACHE_TTL = 300
+
+
+def entity_key(model, pk):
+    return f"crm:entity:{model._meta.label_lower}:{pk}"
+
+
+def generation_key(model):
+    return f"crm:entity-generation:{model._meta.label_lower}"
+
+
+def bump_entity_generation(model):
+    """Drop every cached `model` object, for writes that skip post_save (update())."""
+    # From the clock rather than +1 so an evicted key never repeats an old value
+    cache.set(generation_key(model), time.time_ns(), None)
+
+
+def invalidate_entity(model, pk):
+    cache.delete(entity_key(model, pk))
+
+
+def invalidate_entities(model, pks):
+    cache.delete_many([entity_key(model, pk) for pk in pks])
+
+
+class EntityCache:
+    """Read-through cache of model instances keyed by type and pk.
+
+    Entries are stored with their model's generation. A save or delete drops
+    that object's entry (crm.signals); update() callers bump the generation,
+    which retires every entry of the model at once. get_many() reads the
+    generation and all entries in one cache round trip and fetches the misses
+    in one query.
+    """
+
+    @property
+    def ttl(self):
+        if not cache_is_shared():
+            return 0
+        return getattr(settings, "CRM_ENTITY_CACHE_TTL", DEFAULT_ENTITY_CACHE_TTL)
+
+    def get_many(self, model, pks):
+        """{pk: instance} for the pks that exist; pks may be strings.
+
+        A pk that isn't valid for the model (a non-numeric id from a client)
+        is skipped like a missing row rather than failing the whole lookup.
+        """
+        to_pk = model._meta.pk.to_python
+        parsed = set()
+        for pk in pks:
+            try:
+                parsed.add(to_pk(pk))
+            except ValidationError:
+                pass
+        pks = parsed
+        if not pks:
+            return {}
+        if not self.ttl:
+            return model.objects.in_bulk(pks)
+
+        keys = {entity_key(model, pk): pk for pk in pks}
+        gen_key = generation_key(model)
+        found = cache.get_many([gen_key, *keys])
+        generation = found.pop(gen_key, None)
+        if generation is None:
+            # Nothing cached can be trusted without a generation: start a new one
+            generation = time.time_ns()
+            if not cache.add(gen_key, generation, None):
+                generation = cache.get(gen_key)
+            found = {}
+
+        objects = {}
+        for key, (entry_generation, obj) in found.items():
+            if entry_generation == generation:
+                objects[keys[key]] = obj
+
+        missing = pks - objects.keys()
+        if missing:
+            fetched = model.objects.in_bulk(missing)
+            cache.set_many(
+                {entity_key(model, pk): (generation, obj) for pk, obj in fetched.items()},
+                self.ttl,
+            )
+            objects.update(fetched)
+        return objects
+
+    def get(self, model, pk):
+        try:
+            pk = model._meta.pk.to_python(pk)
+        except ValidationError:
+            return None
+        return self.get_many(model, [pk]).get(pk)
+
+
+entity_cache = EntityCache()
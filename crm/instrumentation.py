@@ -0,0 +1,186 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from graphql.type import get_named_type, is_leaf_type
+
+from .document_cache import document_cache
+
+# Request header (as it appears in request.META) that asks for per-resolver
+# timings under `extensions.timing` in the response
+DEFAULT_DEBUG_HEADER = "HTTP_X_GRAPHQL_DEBUG"
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+
+
+# ---------------- SQL accounting ----------------
+_sql = threading.local()
+
+
+def sql_totals():
+    """(queries, seconds) run on this thread's connections since it started."""
+    return getattr(_sql, "count", 0), getattr(_sql, "duration", 0.0)
+
+
+def count_sql(execute, sql, params, many, context):
+    """Connection execute wrapper feeding sql_totals(); installed by crm.signals."""
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _sql.count = getattr(_sql, "count", 0) + 1
+        _sql.duration = getattr(_sql, "duration", 0.0) + time.perf_counter() - start
+
+
+# ---------------- Histograms ----------------
+class Histogram:
+    """A labelled Prometheus-style histogram (cumulative buckets, sum and count)."""
+
+    def __init__(self, name, help, buckets, label="field"):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(
+                (key, counts[:], total, count)
+                for key, (counts, total, count) in self._series.items()
+            )
+        for label_value, counts, total, count in series:
+            label = f'{self.label}="{escape_label(label_value)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return "\n".join(lines)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+resolver_duration = Histogram(
+    "crm_graphql_resolver_duration_seconds",
+    "Wall time of each GraphQL resolver, by schema field.",
+    DURATION_BUCKETS,
+)
+resolver_sql_queries = Histogram(
+    "crm_graphql_resolver_sql_queries",
+    "SQL queries run by each GraphQL resolver call, by schema field.",
+    QUERY_COUNT_BUCKETS,
+)
+resolver_sql_duration = Histogram(
+    "crm_graphql_resolver_sql_duration_seconds",
+    "Time spent in SQL by each GraphQL resolver call, by schema field.",
+    DURATION_BUCKETS,
+)
+HISTOGRAMS = (resolver_duration, resolver_sql_queries, resolver_sql_duration)
+
+
+# ---------------- Middleware ----------------
+def field_path(path):
+    """`allOrders.edges.node.product` for a resolver path, list indexes dropped."""
+    keys = []
+    while path is not None:
+        if isinstance(path.key, str):
+            keys.append(path.key)
+        path = path.prev
+    return ".".join(reversed(keys))
+
+
+def schema_field(info):
+    """`OrderType.product`: a bounded metrics label, unlike paths built from aliases."""
+    return f"{info.parent_type.name}.{info.field_name}"
+
+
+def debug_requested(request):
+    header = getattr(settings, "CRM_GRAPHQL_DEBUG_HEADER", DEFAULT_DEBUG_HEADER)
+    return bool(request.META.get(header))
+
+
+class ResolverTimingMiddleware:
+    """Time every resolver and count the SQL it runs.
+
+    Each call of a non-leaf field (and any leaf field that ran SQL, like
+    totalCount) is observed into the histograms above under its schema field,
+    so clients choosing aliases can't mint new series. When the context
+    carries a `crm_timing` dict (the view adds one for requests sending the
+    debug header) the same figures are summed into it per response path for
+    `extensions.timing`.
+
+    SQL that runs after a resolver returns - a plain list field whose
+    queryset graphql-core iterates later - isn't attributed to it.
+    """
+
+    def resolve(self, next, root, info, **args):
+        queries, sql_seconds = sql_totals()
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            elapsed = time.perf_counter() - start
+            end_queries, end_sql_seconds = sql_totals()
+            queries = end_queries - queries
+            if queries or not is_leaf_type(get_named_type(info.return_type)):
+                self.record(info, elapsed, queries, end_sql_seconds - sql_seconds)
+
+    def record(self, info, elapsed, queries, sql_seconds):
+        field = schema_field(info)
+        resolver_duration.observe(field, elapsed)
+        resolver_sql_queries.observe(field, queries)
+        resolver_sql_duration.observe(field, sql_seconds)
+
+        timing = getattr(info.context, "crm_timing", None)
+        if timing is None:
+            return
+        path = field_path(info.path)
+        entry = timing.setdefault(path, {"calls": 0, "ms": 0.0, "sql": 0, "sql_ms": 0.0})
+        entry["calls"] += 1
+        entry["ms"] += elapsed * 1000
+        entry["sql"] += queries
+        entry["sql_ms"] += sql_seconds * 1000
+
+
+def timing_report(timing):
+    """Round the per-path figures and list the slowest paths first."""
+    return {
+        path: {**entry, "ms": round(entry["ms"], 3), "sql_ms": round(entry["sql_ms"], 3)}
+        for path, entry in sorted(timing.items(), key=lambda item: -item[1]["ms"])
+    }
+
+
+def render_metrics():
+    """Prometheus text exposition of the resolver histograms and document cache."""
+    parts = [histogram.expose() for histogram in HISTOGRAMS]
+    for name, value in document_cache.stats().items():
+        metric = f"crm_graphql_document_cache_{name}"
+        if name in ("hits", "misses", "evictions"):
+            parts.append(f"# TYPE {metric}_total counter\n{metric}_total {value}")
+        else:
+            parts.append(f"# TYPE {metric} gauge\n{metric} {value}")
+    return "\n".join(parts) + "\n"
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from .counting import bump_model_version
+from .entity_cache import invalidate_entities
+from .models import Order, OrderItem, Product
+
+
+class InsufficientStock(Exception):
+    """Some products don't have the quantity an order asked for."""
+
+    def __init__(self, names):
+        self.names = names
+        super().__init__(f"Insufficient stock for: {', '.join(names)}")
+
+
+def reserve_stock(quantities):
+    """Take {product pk: quantity} off Product.stock with one guarded UPDATE.
+
+    The UPDATE only matches rows that still hold enough stock, so concurrent
+    orders can't oversell however their reads interleave. If any product
+    falls short nothing is taken and InsufficientStock names them. Call it
+    inside the order's transaction; it invalidates no caches (update()
+    skips the signals), so callers do that once the transaction is done.
+    """
+    if not quantities:
+        return
+    needed = Case(
+        *(When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()),
+        output_field=PositiveIntegerField(),
+    )
+    products = Product.objects.filter(pk__in=list(quantities))
+    with transaction.atomic():
+        taken = products.filter(stock__gte=needed).update(stock=F("stock") - needed)
+        if taken != len(quantities):
+            transaction.set_rollback(True)
+    if taken != len(quantities):
+        short = products.filter(stock__lt=needed).order_by("pk").values_list("name", flat=True)
+        raise InsufficientStock(list(short))
+
+
+def place_order(customer, quantities, order_date=None):
+    """Create `customer`'s order of {product pk: quantity}; returns (order, items).
+
+    The one path every order mutation goes through: the products are locked
+    (in pk order, so concurrent orders don't deadlock), the lines capture
+    their current prices, the stock is taken with reserve_stock and the total
+    is summed in SQL. Unknown product pks (None for ones that didn't parse)
+    raise ValueError, short stock InsufficientStock; either way nothing is
+    written. `items` are in product pk order.
+    """
+    with transaction.atomic():
+        products = list(
+            Product.objects.select_for_update()
+            .filter(pk__in=quantities.keys() - {None})
+            .order_by("pk")
+        )
+        if not products:
+            raise ValueError("No valid products found")
+        if len(products) != len(quantities):
+            # If any product id is invalid, count will differ
+            raise ValueError("Some product IDs are invalid")
+
+        order = Order.objects.create(customer=customer, order_date=order_date or timezone.now())
+        items = OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=p, quantity=quantities[p.pk], unit_price=p.price)
+            for p in products
+        ])
+        reserve_stock(quantities)
+        # Saves the total, and post_save brings the customer's stats up to date
+        order.calculate_total_amount()
+    # bulk_create and update() skip the signals, so invalidate caches here
+    bump_model_version(OrderItem)
+    bump_model_version(Product)
+    invalidate_entities(Product, quantities)
+    return order, items
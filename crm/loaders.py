@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from .entity_cache import entity_cache
+from .models import Customer, OrderItem, Product
+
+
+# ---------------- Batch loaders (per request) ----------------
+# graphene runs synchronously behind GraphQLView, so we can't defer a load
+# until the end of a tick like a JS DataLoader does. Instead the connection
+# field primes the loaders with every node of the page it just resolved, and
+# the first load() for any of those keys fetches the whole page in one query.
+class BatchLoader:
+    def __init__(self, batch_load_fn):
+        self.batch_load_fn = batch_load_fn
+        self._pending = {}
+        self._cache = {}
+
+    def prime(self, keys):
+        for key in keys:
+            if key not in self._cache:
+                self._pending[key] = None
+
+    def set(self, key, value):
+        """Seed a value the caller already has, e.g. a mutation's own rows."""
+        self._pending.pop(key, None)
+        self._cache[key] = value
+
+    def load(self, key):
+        if key not in self._cache:
+            self._pending[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def dispatch(self):
+        keys = list(self._pending)
+        self._pending = {}
+        if not keys:
+            return
+        results = self.batch_load_fn(keys)
+        for key in keys:
+            self._cache[key] = results.get(key)
+
+
+def load_customers(customer_ids):
+    return entity_cache.get_many(Customer, customer_ids)
+
+
+def load_order_items(order_ids):
+    # One query over the order lines, ordered by product pk so the first line
+    # matches what `order.products.first()` used to return. The products
+    # themselves come from the entity cache (one more query for misses).
+    items = list(OrderItem.objects.filter(order_id__in=order_ids).order_by("product_id"))
+    by_pk = entity_cache.get_many(Product, {item.product_id for item in items})
+    lines = defaultdict(list)
+    for item in items:
+        if item.product_id in by_pk:
+            item.product = by_pk[item.product_id]
+            lines[item.order_id].append(item)
+    return {order_id: lines[order_id] for order_id in order_ids}
+
+
+class CRMLoaders:
+    def __init__(self):
+        self.customer = BatchLoader(load_customers)
+        self.order_items = BatchLoader(load_order_items)
+
+    def prime_orders(self, orders):
+        self.customer.prime(order.customer_id for order in orders)
+        self.order_items.prime(order.pk for order in orders)
+
+
+def get_loaders(info):
+    """Return the loaders attached to this request, creating them on first use."""
+    context = info.context
+    if context is None:
+        # No request to hang state on (e.g. a bare schema.execute call)
+        return CRMLoaders()
+    loaders = getattr(context, "crm_loaders", None)
+    if loaders is None:
+        loaders = CRMLoaders()
+        context.crm_loaders = loaders
+    return loaders
@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from graphene_django.settings import graphene_settings
+from graphql import execute
+
+from .document_cache import document_cache
+
+
+class LocalExecutionError(Exception):
+    """The operation came back with GraphQL errors."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(error.message for error in errors))
+
+
+def execute_local(query, variables=None, operation_name=None):
+    """Run a GraphQL operation against the project schema in this process.
+
+    For cron and Celery jobs: no HTTP round trip, no schema introspection and
+    no need for the web server to be up. Returns the `data` dict, raising
+    LocalExecutionError if the operation had any errors.
+    """
+    schema = graphene_settings.SCHEMA.graphql_schema
+    document, errors = document_cache.get(schema, query)
+    if errors:
+        raise LocalExecutionError(errors)
+    result = execute(
+        schema,
+        document,
+        # Stands in for the request, so per-request loaders still batch
+        context_value=SimpleNamespace(),
+        variable_values=variables,
+        operation_name=operation_name,
+    )
+    if result.errors:
+        raise LocalExecutionError(result.errors)
+    return result.data
@@ -0,0 +1,65 @@
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from crm.models import Customer
+from crm.schema import schema
+
+MUTATION = """
+mutation ($input: [CustomerInput!]!, $batchSize: Int) {
+  bulkCreateCustomers(input: $input, batchSize: $batchSize) { errors }
+}
+"""
+
+
+def legacy_bulk_create(rows):
+    """The per-row exists()/full_clean()/save() loop bulkCreateCustomers used to run."""
+    created, errors = [], []
+    for row in rows:
+        try:
+            if Customer.objects.filter(email=row["email"]).exists():
+                errors.append(f"Email already exists: {row['email']}")
+                continue
+            customer = Customer(**row)
+            customer.full_clean()
+            customer.save()
+            created.append(customer)
+        except ValidationError as e:
+            errors.append(f"{row['email']}: {str(e)}")
+    return created, errors
+
+
+class Command(BaseCommand):
+    help = "Compare bulkCreateCustomers throughput against the old per-row loop (rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--batch-size", type=int, default=None)
+
+    def timed(self, label, rows, run):
+        with transaction.atomic():
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        self.stdout.write(f"{label:>8}: {len(rows)} rows in {elapsed:.2f}s ({len(rows) / elapsed:,.0f} rows/s)")
+        return elapsed
+
+    def handle(self, *args, **options):
+        # Every 20th row repeats an earlier email to exercise the duplicate path
+        rows = [
+            {"name": f"Bench {i}", "email": f"bench{i - (i % 20 == 19)}@example.com", "phone": "+15550000000"}
+            for i in range(options["rows"])
+        ]
+        variables = {"input": rows, "batchSize": options["batch_size"]}
+
+        def run_mutation():
+            result = schema.execute(MUTATION, variable_values=variables)
+            if result.errors:
+                raise result.errors[0]
+
+        old = self.timed("legacy", rows, lambda: legacy_bulk_create(rows))
+        new = self.timed("bulk", rows, run_mutation)
+        self.stdout.write(self.style.SUCCESS(f"speedup: {old / new:.1f}x"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.cleanup import DEFAULT_INACTIVE_DAYS, clean_inactive_customers
+
+
+class Command(BaseCommand):
+    help = "Delete customers with no orders older than --days, in small resumable batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=DEFAULT_INACTIVE_DAYS)
+        parser.add_argument("--batch-size", type=int, help="Customers deleted per transaction")
+        parser.add_argument("--sleep", type=float, help="Seconds to pause between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Count what would be deleted")
+        parser.add_argument(
+            "--restart", action="store_true", help="Ignore the checkpoint of an interrupted run"
+        )
+
+    def handle(self, *args, **options):
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+
+        def progress(total, last_pk):
+            if options["verbosity"] > 1:
+                self.stderr.write(f"{verb} {total} so far (up to pk {last_pk})")
+
+        try:
+            total = clean_inactive_customers(
+                days=options["days"],
+                batch_size=options["batch_size"],
+                sleep=options["sleep"],
+                dry_run=options["dry_run"],
+                resume=not options["restart"],
+                progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        # Just the number on stdout, for the cron wrapper's log line
+        self.stdout.write(str(total))
+        self.stderr.write(f"{verb} {total} inactive customers")
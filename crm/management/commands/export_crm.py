@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.export import EXPORTS, FORMATS, export_rows, parse_filter, render
+
+
+class Command(BaseCommand):
+    help = "Stream orders, customers or products to CSV/NDJSON in constant memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=FORMATS, default="csv")
+        parser.add_argument("--filter", help="JSON matching the GraphQL <Model>FilterInput")
+        parser.add_argument("--output", "-o", help="File to write (default: stdout)")
+        parser.add_argument("--chunk-size", type=int, help="Rows fetched per round trip")
+
+    def handle(self, *args, **options):
+        try:
+            filter = parse_filter(options["name"], options["filter"])
+        except ValueError as e:
+            raise CommandError(f"Invalid filter: {e}")
+
+        columns, rows = export_rows(options["name"], filter, options["chunk_size"])
+        lines = render(columns, rows, options["format"])
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        count = -1 if options["format"] == "csv" else 0
+        with open(options["output"], "w", encoding="utf-8", newline="") as out:
+            for line in lines:
+                out.write(line)
+                count += 1
+        self.stderr.write(f"Exported {count} {options['name']} to {options['output']}")
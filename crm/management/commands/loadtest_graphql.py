@@ -0,0 +1,84 @@
+import asyncio
+import json
+import statistics
+import time
+
+import aiohttp
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_QUERY = """
+query {
+  allOrders(first: 20) {
+    totalCount
+    edges { node { id totalAmount customer { name } products(first: 5) { edges { node { name price } } } } }
+  }
+}
+"""
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def run_load(url, query, requests, concurrency):
+    """POST `query` to `url` `requests` times, `concurrency` at a time."""
+    latencies, errors = [], 0
+    remaining = iter(range(requests))
+    payload = json.dumps({"query": query})
+    headers = {"Content-Type": "application/json"}
+
+    async def worker(session):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                async with session.post(url, data=payload, headers=headers) as response:
+                    body = await response.json(content_type=None)
+                    if response.status != 200 or body.get("errors"):
+                        errors += 1
+            except (aiohttp.ClientError, ValueError):
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a GraphQL endpoint and compare it with another, e.g. the WSGI "
+        "server's /graphql against the ASGI server's /graphql/async."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", help="GraphQL endpoints to test in turn")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--query-file", help="Send this document instead of the default report query")
+
+    def handle(self, *args, **options):
+        query = DEFAULT_QUERY
+        if options["query_file"]:
+            with open(options["query_file"], encoding="utf-8") as f:
+                query = f.read()
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be positive")
+
+        self.stdout.write(
+            f"{'endpoint':40} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}"
+        )
+        for url in options["urls"]:
+            latencies, errors, elapsed = asyncio.run(
+                run_load(url, query, options["requests"], options["concurrency"])
+            )
+            ms = [latency * 1000 for latency in latencies]
+            self.stdout.write(
+                f"{url:40} {len(ms) / elapsed:8.1f} {statistics.median(ms):8.1f} "
+                f"{percentile(ms, 95):8.1f} {percentile(ms, 99):8.1f} {errors:7d}"
+            )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of customers and products."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Rows indexed per statement batch")
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend is None:
+            raise CommandError("This database has no search index (see migration 0008)")
+        total = rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(f"Indexed {total} rows ({backend})")
@@ -0,0 +1,58 @@
+import importlib.util
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from graphene_django.settings import graphene_settings
+from graphql import parse, validate
+
+from crm import cron, tasks
+from crm.persisted import get_query_store, query_hash
+
+REMINDERS_SCRIPT = Path(cron.__file__).parent / "cron_jobs" / "send_order_reminders.py"
+
+
+def load_script(path):
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def job_queries():
+    """(label, query) for every operation the scheduled jobs send."""
+    reminders = load_script(REMINDERS_SCRIPT)
+    return [
+        ("crm.tasks.generate_crm_report", tasks.REPORT_QUERY),
+        ("crm.cron.log_crm_heartbeat", cron.HEARTBEAT_QUERY),
+        ("crm.cron.update_low_stock", cron.LOW_STOCK_MUTATION),
+        ("send_order_reminders.py", reminders.PENDING_ORDERS_QUERY),
+        ("send_order_reminders.py", reminders.MARK_REMINDED_MUTATION),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Register the CRM job queries (and any extra .graphql files) as persisted queries."
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="*", help="Extra .graphql documents to register")
+
+    def handle(self, *args, **options):
+        store = get_query_store()
+        if not store.persistent:
+            self.stderr.write(self.style.WARNING(
+                f"{type(store).__name__} only lives in this process; set "
+                "CRM_PERSISTED_QUERY_STORE to the database or file store to preload the server."
+            ))
+
+        queries = job_queries() + [
+            (path, Path(path).read_text(encoding="utf-8")) for path in options["files"]
+        ]
+        schema = graphene_settings.SCHEMA.graphql_schema
+        for label, query in queries:
+            errors = validate(schema, parse(query))
+            if errors:
+                self.stderr.write(self.style.ERROR(f"skipped {label}: {errors[0].message}"))
+                continue
+            sha256 = query_hash(query)
+            store.set(sha256, query)
+            self.stdout.write(f"{sha256}  {label}")
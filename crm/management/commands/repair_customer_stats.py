@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.customer_stats import repair_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every customer's order_count, lifetime_value and last_order_at."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, help="Customers recomputed per transaction")
+
+    def handle(self, *args, **options):
+        def progress(total, last_pk):
+            if options["verbosity"] > 1:
+                self.stderr.write(f"Recomputed {total} so far (up to pk {last_pk})")
+
+        try:
+            total = repair_stats(batch_size=options["batch_size"], progress=progress)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Recomputed {total} customers")
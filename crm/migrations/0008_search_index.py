@@ -0,0 +1,74 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:02
+
+import re
+
+from django.db import migrations
+
+# Full-text index for Query.search, maintained by crm.search. One row per
+# customer/product keyed by pk * 16 + kind (1 customer, 2 product). SQLite
+# gets an FTS5 table (the key is its rowid); Postgres a tsvector column with
+# a GIN index. Other backends get neither and crm.search scans instead.
+FTS5_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS crm_search USING fts5("
+    "body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+POSTGRES_TABLE = (
+    "CREATE TABLE IF NOT EXISTS crm_search (key bigint PRIMARY KEY, document tsvector NOT NULL)"
+)
+POSTGRES_INDEX = "CREATE INDEX IF NOT EXISTS crm_search_document_idx ON crm_search USING gin (document)"
+
+SEARCHABLE = (('Customer', 1, ('name', 'email')), ('Product', 2, ('name',)))
+BACKFILL_BATCH_SIZE = 1000
+
+
+def fts5_available(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_TABLE)
+        schema_editor.execute(POSTGRES_INDEX)
+        insert = (
+            "INSERT INTO crm_search (key, document) VALUES (%s, to_tsvector('simple', %s)) "
+            "ON CONFLICT (key) DO NOTHING"
+        )
+    elif vendor == 'sqlite' and fts5_available(schema_editor):
+        schema_editor.execute(FTS5_TABLE)
+        insert = "INSERT INTO crm_search (rowid, body) VALUES (%s, %s)"
+    else:
+        return
+
+    # Index the rows that already exist; new writes go through crm.search
+    for model_name, kind, fields in SEARCHABLE:
+        rows = apps.get_model('crm', model_name).objects.order_by('pk').values_list('pk', *fields)
+        batch = []
+        for pk, *values in rows.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+            words = re.findall(r'\w+', ' '.join(value or '' for value in values))
+            batch.append((pk * 16 + kind, ' '.join(words)))
+            if len(batch) >= BACKFILL_BATCH_SIZE:
+                with schema_editor.connection.cursor() as cursor:
+                    cursor.executemany(insert, batch)
+                batch = []
+        if batch:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(insert, batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS crm_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_order_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:10
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_stats(apps, schema_editor):
+    # Same as crm.customer_stats.repair_stats, against the historical models
+    Customer = apps.get_model('crm', 'Customer')
+    Order = apps.get_model('crm', 'Order')
+    orders = Order.objects.filter(customer=OuterRef('pk')).order_by().values('customer')
+    ids = list(Customer.objects.filter(orders__isnull=False).distinct().values_list('pk', flat=True))
+    for start in range(0, len(ids), BACKFILL_BATCH_SIZE):
+        Customer.objects.filter(pk__in=ids[start:start + BACKFILL_BATCH_SIZE]).update(
+            order_count=Coalesce(Subquery(orders.annotate(n=Count('pk')).values('n')), 0),
+            lifetime_value=Coalesce(
+                Subquery(orders.annotate(v=Sum('total_amount')).values('v')),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            ),
+            last_order_at=Subquery(orders.annotate(at=Max('order_date')).values('at')),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_value',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['order_count', 'id'], name='crm_customer_order_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['lifetime_value', 'id'], name='crm_customer_ltv_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_order_at', 'id'], name='crm_customer_last_order_idx'),
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
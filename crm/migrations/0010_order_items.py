@@ -0,0 +1,103 @@
+# Generated by Django 5.2.4 on 2026-10-18 06:25
+
+from decimal import ROUND_DOWN, Decimal
+from itertools import groupby
+from operator import itemgetter
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+COPY_BATCH_SIZE = 1000
+CENT = Decimal('0.01')
+
+
+def line_prices(total, prices):
+    """Split an order's stored total over its lines in proportion to `prices`.
+
+    Shares are rounded down to the cent and the remainder goes on the last
+    line, so they add up to `total` exactly and never go negative.
+    """
+    weights = prices if sum(prices) > 0 else [Decimal('1')] * len(prices)
+    scale = total / sum(weights)
+    shares = [(weight * scale).quantize(CENT, rounding=ROUND_DOWN) for weight in weights]
+    shares[-1] += total - sum(shares)
+    return shares
+
+
+def copy_order_lines(apps, schema_editor):
+    # Each old M2M row becomes one unit. The price it sold at wasn't kept, and
+    # the product's current price needn't match it, so the order's stored
+    # total_amount is split over its lines (weighted by current price). The
+    # unit prices are an estimate, but the lines add up to the total, so
+    # calculate_total_amount() gives the same figure it always had.
+    Order = apps.get_model('crm', 'Order')
+    OrderItem = apps.get_model('crm', 'OrderItem')
+    rows = (
+        Order.products.through.objects.order_by('order_id', 'pk')
+        .values_list('order_id', 'product_id', 'product__price', 'order__total_amount')
+    )
+    batch = []
+    for order_id, lines in groupby(rows.iterator(chunk_size=COPY_BATCH_SIZE), key=itemgetter(0)):
+        lines = list(lines)
+        total = lines[0][3]
+        prices = line_prices(total, [price for _, _, price, _ in lines])
+        for (_, product_id, _, _), unit_price in zip(lines, prices):
+            batch.append(OrderItem(order_id=order_id, product_id=product_id, quantity=1, unit_price=unit_price))
+        if len(batch) >= COPY_BATCH_SIZE:
+            OrderItem.objects.bulk_create(batch)
+            batch = []
+    OrderItem.objects.bulk_create(batch)
+
+
+def copy_order_lines_back(apps, schema_editor):
+    # Quantities don't fit the old table: every line goes back as one row
+    Order = apps.get_model('crm', 'Order')
+    OrderProduct = Order.products.through
+    rows = apps.get_model('crm', 'OrderItem').objects.order_by('pk').values_list('order_id', 'product_id')
+    batch = []
+    for order_id, product_id in rows.iterator(chunk_size=COPY_BATCH_SIZE):
+        batch.append(OrderProduct(order_id=order_id, product_id=product_id))
+        if len(batch) >= COPY_BATCH_SIZE:
+            OrderProduct.objects.bulk_create(batch)
+            batch = []
+    OrderProduct.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0009_customer_order_stats'),
+    ]
+
+    # Django can't add through= to an existing M2M, so build the new table,
+    # copy the lines over, drop the old field and its table, then declare
+    # the field again on top of OrderItem (a state-only change).
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='crm.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='crm.product')),
+            ],
+            options={
+                'constraints': [
+                    models.UniqueConstraint(fields=('order', 'product'), name='crm_order_item_uniq'),
+                    models.CheckConstraint(condition=models.Q(('quantity__gte', 1)), name='crm_order_item_quantity_gte_1'),
+                ],
+            },
+        ),
+        migrations.RunPython(copy_order_lines, copy_order_lines_back),
+        migrations.RemoveField(
+            model_name='order',
+            name='products',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='products',
+            field=models.ManyToManyField(related_name='orders', through='crm.OrderItem', to='crm.product'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator, RegexValidator
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 
 class Customer(models.Model):
@@ -17,6 +18,22 @@ class Customer(models.Model):
         ]
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Denormalized from the customer's orders by crm.customer_stats
+    order_count = models.PositiveIntegerField(default=0)
+    lifetime_value = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    last_order_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Match CustomerFilterInput and the orderBy/keyset columns (sort key + id)
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="crm_customer_created_idx"),
+            models.Index(fields=["name", "id"], name="crm_customer_name_idx"),
+            models.Index(fields=["order_count", "id"], name="crm_customer_order_count_idx"),
+            models.Index(fields=["lifetime_value", "id"], name="crm_customer_ltv_idx"),
+            models.Index(fields=["last_order_at", "id"], name="crm_customer_last_order_idx"),
+            # varchar_pattern_ops lets Postgres use it for phone__startswith
+            models.Index(fields=["phone"], name="crm_customer_phone_idx", opclasses=["varchar_pattern_ops"]),
+        ]
 
     def __str__(self):
         return self.name
@@ -31,20 +48,163 @@ class Product(models.Model):
     )
     stock = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["price", "id"], name="crm_product_price_idx"),
+            models.Index(fields=["stock", "id"], name="crm_product_stock_idx"),
+            models.Index(fields=["name", "id"], name="crm_product_name_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
 class Order(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "PENDING", "Pending"
+        COMPLETED = "COMPLETED", "Completed"
+        CANCELLED = "CANCELLED", "Cancelled"
+
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    products = models.ManyToManyField(Product, related_name='orders')
+    products = models.ManyToManyField(Product, through='OrderItem', related_name='orders')
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     order_date = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    # Set by the reminder job so each run only picks up orders it hasn't seen
+    reminded_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["order_date", "id"], name="crm_order_date_idx"),
+            models.Index(fields=["total_amount", "id"], name="crm_order_total_idx"),
+            models.Index(fields=["customer", "order_date"], name="crm_order_customer_date_idx"),
+            models.Index(fields=["status", "order_date"], name="crm_order_status_date_idx"),
+            # Only pending orders not reminded yet: stays small however many orders
+            # a reminder window holds
+            models.Index(
+                fields=["order_date", "id"],
+                name="crm_order_unreminded_idx",
+                condition=models.Q(status="PENDING", reminded_at__isnull=True),
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        order = super().from_db(db, field_names, values)
+        # The customer as loaded: a save that moves the order recomputes both
+        # customers' stats (None when only() deferred the column)
+        order.loaded_customer_id = order.__dict__.get("customer_id")
+        return order
+
+    @staticmethod
+    def items_total():
+        """SQL expression for the sum of an order's lines, for update()/annotate()."""
+        lines = (
+            OrderItem.objects.filter(order=models.OuterRef("pk"))
+            .order_by()
+            .values("order")
+            .annotate(total=models.Sum(OrderItem.line_total()))
+            .values("total")
+        )
+        return Coalesce(
+            models.Subquery(lines),
+            models.Value(Decimal("0")),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
 
     def calculate_total_amount(self):
-        total = sum(product.price for product in self.products.all())
-        self.total_amount = total
-        self.save()
+        # Summed by the database from the captured unit prices, then saved rather
+        # than update()d so post_save keeps the customer's stats in step
+        total = (
+            Order.objects.filter(pk=self.pk)
+            .annotate(items_total=Order.items_total())
+            .values_list("items_total", flat=True)
+            .get()
+        )
+        self.total_amount = total.quantize(Decimal("0.01"))
+        self.save(update_fields=["total_amount"])
 
     def __str__(self):
         return f"Order {self.id} - {self.customer.name}"
+
+
+class OrderItem(models.Model):
+    """One line of an order: the product, how many, and the price it sold at."""
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="order_items")
+    quantity = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
+    # Product.price when the order was placed; later price changes don't touch it
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["order", "product"], name="crm_order_item_uniq"),
+            models.CheckConstraint(condition=models.Q(quantity__gte=1), name="crm_order_item_quantity_gte_1"),
+        ]
+
+    @staticmethod
+    def line_total():
+        return models.ExpressionWrapper(
+            models.F("quantity") * models.F("unit_price"),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+
+    def __str__(self):
+        return f"{self.order_id}: {self.product_id} x{self.quantity}"
+
+
+class PersistedQuery(models.Model):
+    """A GraphQL document registered under its sha256, for persisted queries."""
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    query = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
+class JobCheckpoint(models.Model):
+    """How far a resumable batch job got, so a rerun in a new process picks up there."""
+
+    name = models.CharField(max_length=100, primary_key=True)
+    position = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class DailyCrmRollup(models.Model):
+    """Per-day report totals, folded in by crm.rollups once the day is over."""
+
+    day = models.DateField(unique=True)
+    new_customers = models.PositiveIntegerField(default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["day"]
+
+    def __str__(self):
+        return f"{self.day}: {self.order_count} orders"
+
+
+class DailyProductRollup(models.Model):
+    """Units and revenue of one product on one day."""
+
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_rollups")
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ["day", "product"]
+        constraints = [
+            models.UniqueConstraint(fields=["day", "product"], name="crm_product_rollup_day_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.product_id} x{self.units}"
@@ -0,0 +1,152 @@
+from django.db.models import Prefetch
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from .models import Customer, Product, Order, OrderItem
+
+
+# ---------------- Field maps ----------------
+# GraphQL field name -> model column (or columns), per model
+MODEL_COLUMNS = {
+    Customer: {
+        "id": "id",
+        "name": "name",
+        "email": "email",
+        "phone": "phone",
+        "createdAt": "created_at",
+        "orderCount": "order_count",
+        "lifetimeValue": "lifetime_value",
+        "lastOrderAt": "last_order_at",
+    },
+    Product: {
+        "id": "id",
+        "name": "name",
+        "price": "price",
+        "stock": "stock",
+    },
+    Order: {
+        "id": "id",
+        "totalAmount": "total_amount",
+        "orderDate": "order_date",
+        "status": "status",
+        "remindedAt": "reminded_at",
+    },
+    OrderItem: {
+        "quantity": "quantity",
+        "unitPrice": "unit_price",
+        "lineTotal": ("quantity", "unit_price"),
+    },
+}
+
+# GraphQL field name -> (model relation, is a connection), per model.
+# OrderType.product is a plain object field served from the products prefetch.
+MODEL_RELATIONS = {
+    Customer: {"orders": ("orders", True)},
+    Product: {"orders": ("orders", True)},
+    Order: {
+        "customer": ("customer", False),
+        "products": ("products", True),
+        "product": ("products", False),
+        "items": ("items", False),
+    },
+    OrderItem: {"product": ("product", False)},
+}
+
+
+# ---------------- Selection set walking ----------------
+def collect_fields(field_nodes, info):
+    """Merge the sub-selections of `field_nodes` into {name: [FieldNode, ...]}."""
+    fields = {}
+
+    def visit(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                visit(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = info.fragments.get(selection.name.value)
+                if fragment is not None:
+                    visit(fragment.selection_set)
+
+    for field_node in field_nodes:
+        visit(field_node.selection_set)
+    return fields
+
+
+def connection_node_fields(field_nodes, info):
+    """Fields selected under `edges { node { ... } }` of a connection."""
+    edges = collect_fields(field_nodes, info).get("edges", [])
+    nodes = collect_fields(edges, info).get("node", [])
+    return collect_fields(nodes, info)
+
+
+# ---------------- Planning ----------------
+def plan(model, fields, info, prefix=""):
+    """Return (only, select_related, prefetches) for `fields` selected on `model`."""
+    columns = MODEL_COLUMNS[model]
+    relations = MODEL_RELATIONS[model]
+
+    only = {prefix + model._meta.pk.name}
+    select = []
+    prefetches = {}
+    to_prefetch = {}
+
+    for name, nodes in fields.items():
+        if name in columns:
+            column = columns[name]
+            only.update(prefix + c for c in ((column,) if isinstance(column, str) else column))
+            continue
+        if name not in relations:
+            continue
+        attr, is_connection = relations[name]
+        if is_connection:
+            sub_fields = connection_node_fields(nodes, info)
+        else:
+            sub_fields = collect_fields(nodes, info)
+
+        field = model._meta.get_field(attr)
+        if field.many_to_one:
+            # Forward FK: join it and prune its columns in the same statement
+            only.add(prefix + attr)
+            select.append(prefix + attr)
+            sub_only, sub_select, sub_prefetches = plan(
+                field.related_model, sub_fields, info, prefix=f"{prefix}{attr}__"
+            )
+            only |= sub_only
+            select += sub_select
+            prefetches.update(sub_prefetches)
+        else:
+            # `products` and `product` share one prefetch, so merge their fields
+            merged = to_prefetch.setdefault(prefix + attr, (field, {}))[1]
+            for sub_name, sub_nodes in sub_fields.items():
+                merged.setdefault(sub_name, []).extend(sub_nodes)
+
+    for lookup, (field, sub_fields) in to_prefetch.items():
+        keep = ()
+        if field.one_to_many:
+            # Reverse FK: the prefetch groups rows on the FK, so keep it loaded
+            keep = (field.field.name,)
+        queryset = optimize(field.related_model.objects.all(), sub_fields, info, keep)
+        prefetches[lookup] = Prefetch(lookup, queryset=queryset)
+
+    return only, select, prefetches
+
+
+def optimize(queryset, fields, info, keep=()):
+    only, select, prefetches = plan(queryset.model, fields, info)
+    only.update(keep)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches.values())
+    return queryset.only(*only)
+
+
+def optimize_connection(queryset, info):
+    """Apply select_related/prefetch_related/only() for a connection resolver."""
+    fields = connection_node_fields(info.field_nodes, info)
+    if not fields:
+        return queryset
+    return optimize(queryset, fields, info)
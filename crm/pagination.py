@@ -0,0 +1,133 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import F, Q
+from graphene.relay.connection import connection_adapter, page_info_adapter
+from graphql import GraphQLError
+
+KEYSET_PREFIX = "keyset:"
+
+
+# ---------------- Sort keys ----------------
+def resolve_field(model, path):
+    """Follow a `customer__name` style lookup path to its model field."""
+    field = None
+    for part in path.split("__"):
+        field = model._meta.pk if part == "pk" else model._meta.get_field(part)
+        if field.is_relation:
+            model = field.related_model
+    return field
+
+
+def sort_keys(queryset):
+    """[(lookup, descending, field)] for the queryset ordering plus a pk tie-breaker."""
+    model = queryset.model
+    keys = []
+    for item in queryset.query.order_by:
+        if not isinstance(item, str) or item == "?":
+            raise GraphQLError("Keyset pagination only supports plain field orderings")
+        descending = item.startswith("-")
+        lookup = item.lstrip("-")
+        if lookup == model._meta.pk.name:
+            lookup = "pk"
+        field = resolve_field(model, lookup)
+        if field.is_relation:
+            # Ordering by a FK orders by the related pk
+            lookup = f"{lookup}__pk"
+            field = field.target_field
+        if field.null:
+            raise GraphQLError(f"Keyset pagination can't order by nullable field '{lookup}'")
+        keys.append((lookup, descending, field))
+    if not any(lookup == "pk" for lookup, _, _ in keys):
+        keys.append(("pk", False, model._meta.pk))
+    return keys
+
+
+# ---------------- Cursors ----------------
+def _dump(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    payload = json.dumps([_dump(value) for value in values])
+    return base64.b64encode((KEYSET_PREFIX + payload).encode()).decode()
+
+
+def decode_cursor(cursor, keys):
+    try:
+        raw = base64.b64decode(cursor).decode()
+        if not raw.startswith(KEYSET_PREFIX):
+            raise ValueError
+        values = json.loads(raw[len(KEYSET_PREFIX):])
+        if len(values) != len(keys):
+            raise ValueError
+        return [field.to_python(value) for (_, _, field), value in zip(keys, values)]
+    except Exception:
+        raise GraphQLError("Invalid keyset cursor") from None
+
+
+def seek_filter(keys, values, reverse=False):
+    """Rows strictly after `values` in the (lexicographic) key order."""
+    condition = Q()
+    for i, (lookup, descending, _) in enumerate(keys):
+        step = Q(**{f"{lookup}__{'lt' if descending != reverse else 'gt'}": values[i]})
+        equal = Q(**{prev: values[j] for j, (prev, _, _) in enumerate(keys[:i])})
+        condition |= equal & step
+    return condition
+
+
+# ---------------- Connection ----------------
+def keyset_connection(connection_type, args, queryset):
+    """Build a connection page by seeking past the cursor instead of OFFSET."""
+    first, last = args.get("first"), args.get("last")
+    after, before = args.get("after"), args.get("before")
+    if first is None and last is None:
+        raise GraphQLError("Keyset pagination requires `first` or `last`")
+    if (first is not None and first < 0) or (last is not None and last < 0):
+        raise GraphQLError("`first` and `last` must be non-negative")
+
+    keys = sort_keys(queryset)
+    backward = first is None
+    limit = last if backward else first
+
+    # Annotated keys are always selected, even when only() pruned the columns
+    names = [f"_keyset_{i}" for i in range(len(keys))]
+    queryset = queryset.annotate(**{name: F(lookup) for name, (lookup, _, _) in zip(names, keys)})
+
+    if after:
+        queryset = queryset.filter(seek_filter(keys, decode_cursor(after, keys)))
+    if before:
+        queryset = queryset.filter(seek_filter(keys, decode_cursor(before, keys), reverse=True))
+
+    ordering = [
+        f"{'-' if descending != backward else ''}{name}"
+        for name, (_, descending, _) in zip(names, keys)
+    ]
+    rows = list(queryset.order_by(*ordering)[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+
+    edges = [
+        connection_type.Edge(
+            node=row, cursor=encode_cursor([getattr(row, name) for name in names])
+        )
+        for row in rows
+    ]
+    return connection_adapter(
+        connection_type,
+        edges=edges,
+        pageInfo=page_info_adapter(
+            startCursor=edges[0].cursor if edges else None,
+            endCursor=edges[-1].cursor if edges else None,
+            hasPreviousPage=has_more if backward else bool(after),
+            hasNextPage=bool(before) if backward else has_more,
+        ),
+    )
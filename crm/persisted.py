@@ -0,0 +1,170 @@
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_STORE = "crm.persisted.LRUQueryStore"
+DEFAULT_LRU_SIZE = 1000
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """A small thread-safe LRU mapping."""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+# ---------------- Stores ----------------
+class QueryStore(ABC):
+    """Maps a sha256 hash to the query text registered under it."""
+
+    # Whether registrations outlive the process (a management command can't
+    # preload a store that lives in the web worker's memory)
+    persistent = True
+
+    @abstractmethod
+    def get(self, sha256):
+        """The query registered under `sha256`, or None."""
+
+    @abstractmethod
+    def set(self, sha256, query):
+        """Register `query` under `sha256`."""
+
+
+class LRUQueryStore(LRUCache, QueryStore):
+    persistent = False
+
+    def __init__(self, size=None):
+        super().__init__(
+            size or getattr(settings, "CRM_PERSISTED_QUERY_LRU_SIZE", DEFAULT_LRU_SIZE)
+        )
+
+
+class DatabaseQueryStore(QueryStore):
+    def get(self, sha256):
+        from .models import PersistedQuery
+
+        return (
+            PersistedQuery.objects.filter(sha256=sha256)
+            .values_list("query", flat=True)
+            .first()
+        )
+
+    def set(self, sha256, query):
+        from .models import PersistedQuery
+
+        PersistedQuery.objects.get_or_create(sha256=sha256, defaults={"query": query})
+
+
+class FileQueryStore(QueryStore):
+    """One `<sha256>.graphql` file per query under CRM_PERSISTED_QUERY_DIR."""
+
+    def __init__(self, directory=None):
+        self.directory = Path(
+            directory
+            or getattr(settings, "CRM_PERSISTED_QUERY_DIR", None)
+            or Path(settings.BASE_DIR) / "persisted_queries"
+        )
+
+    def path(self, sha256):
+        # Hashes come from clients: only accept real hex digests as file names
+        if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+            return None
+        return self.directory / f"{sha256}.graphql"
+
+    def get(self, sha256):
+        path = self.path(sha256)
+        if path is None or not path.exists():
+            return None
+        return path.read_text(encoding="utf-8")
+
+    def set(self, sha256, query):
+        path = self.path(sha256)
+        if path is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path.write_text(query, encoding="utf-8")
+
+
+class CachedQueryStore(QueryStore):
+    """An in-process LRU in front of a persistent store.
+
+    A hash always names the same text, so entries never go stale; misses
+    aren't cached, since the query may be registered later.
+    """
+
+    def __init__(self, store, size=None):
+        self.store = store
+        self.persistent = store.persistent
+        self._cache = LRUCache(
+            size or getattr(settings, "CRM_PERSISTED_QUERY_LRU_SIZE", DEFAULT_LRU_SIZE)
+        )
+
+    def get(self, sha256):
+        query = self._cache.get(sha256)
+        if query is None:
+            query = self.store.get(sha256)
+            if query is not None:
+                self._cache.set(sha256, query)
+        return query
+
+    def set(self, sha256, query):
+        # Clients resend registered text (auto-register): skip the store write
+        if self._cache.get(sha256) != query:
+            self.store.set(sha256, query)
+            self._cache.set(sha256, query)
+
+
+def auto_register(store):
+    """Whether a client sending a query with its hash registers it in `store`.
+
+    Off by default for persistent stores, which anonymous clients could
+    otherwise grow without bound; register those with the
+    register_persisted_queries command. The in-memory LRU is bounded, so
+    it stays on there. CRM_PERSISTED_QUERY_AUTO_REGISTER overrides both.
+    """
+    return getattr(settings, "CRM_PERSISTED_QUERY_AUTO_REGISTER", not store.persistent)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_query_store():
+    """The store named by CRM_PERSISTED_QUERY_STORE, created once per process.
+
+    Persistent stores get a CachedQueryStore in front of them.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = import_string(
+                    getattr(settings, "CRM_PERSISTED_QUERY_STORE", DEFAULT_STORE)
+                )()
+                _store = CachedQueryStore(store) if store.persistent else store
+    return _store
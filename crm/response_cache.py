@@ -0,0 +1,115 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import TypeInfo, TypeInfoVisitor, Visitor, print_ast, visit
+from graphql.type import get_named_type
+
+from .counting import cache_is_shared, model_version
+from .models import Customer, DailyCrmRollup, DailyProductRollup, Order, OrderItem, Product
+from .persisted import LRUCache
+
+# Seconds a cached response lives if no write invalidates it first; 0 disables.
+# Only used with a shared cache, see counting.cache_is_shared()
+DEFAULT_RESPONSE_CACHE_TTL = 30
+# Documents whose normalized hash and models are remembered
+DEFAULT_PLAN_CACHE_SIZE = 1000
+
+# Non-Django types -> the models their resolvers (or filters) read.
+# DjangoObjectTypes and their connections are mapped through Meta.model.
+TYPE_MODELS = {
+    "CrmStatsType": (Customer, Order, OrderItem, Product),
+    "ProductStatsType": (Product,),
+    "CrmReportType": (Customer, Order, DailyCrmRollup, DailyProductRollup, Product),
+    # node/nodes can return any of the Relay types
+    "Node": (Customer, Order, OrderItem, Product),
+    # customerName/productName/productId join other tables
+    "OrderFilterInput": (Customer, Product, OrderItem),
+    # search reads the text index, which changes with these tables
+    "SearchResultConnection": (Customer, Product),
+    "SearchResult": (Customer, Product),
+}
+
+
+def type_models(named_type):
+    meta = getattr(getattr(named_type, "graphene_type", None), "_meta", None)
+    # A connection reads the table of its node type
+    node = getattr(meta, "node", None)
+    if node is not None:
+        meta = node._meta
+    model = getattr(meta, "model", None)
+    if model is not None:
+        return (model, OrderItem) if model is Order else (model,)
+    return TYPE_MODELS.get(named_type.name, ())
+
+
+def document_models(graphql_schema, document):
+    """Every model the fields and arguments anywhere in `document` read from."""
+    models = set()
+    type_info = TypeInfo(graphql_schema)
+
+    class ModelCollector(Visitor):
+        def enter_field(self, node, *args):
+            field_type = type_info.get_type()
+            if field_type is not None:
+                models.update(type_models(get_named_type(field_type)))
+
+        def enter_argument(self, node, *args):
+            argument = type_info.get_argument()
+            if argument is not None:
+                models.update(type_models(get_named_type(argument.type)))
+
+    visit(document, TypeInfoVisitor(type_info, ModelCollector()))
+    return sorted(models, key=lambda model: model._meta.label_lower)
+
+
+class ResponseCache:
+    """Whole query results, keyed on the normalized document plus variables.
+
+    Keys embed the counting module's per-model versions of every model the
+    document reads, so the post_save/post_delete signals and the mutations
+    that bump those versions invalidate entries without tracking them; stale
+    entries just age out. Entries live in the default Django cache and are
+    only written when it is shared by all workers: with per-process memory a
+    write in one worker would leave the others serving stale responses.
+    """
+
+    def __init__(self):
+        self._plans = LRUCache(DEFAULT_PLAN_CACHE_SIZE)
+
+    @property
+    def ttl(self):
+        if not cache_is_shared():
+            return 0
+        return getattr(settings, "CRM_RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_CACHE_TTL)
+
+    def plan(self, graphql_schema, document, query):
+        # The document comes from document_cache, so do the AST work once per text
+        key = (id(graphql_schema), query)
+        plan = self._plans.get(key)
+        if plan is None:
+            digest = hashlib.sha256(print_ast(document).encode()).hexdigest()
+            plan = (digest, document_models(graphql_schema, document))
+            self._plans.set(key, plan)
+        return plan
+
+    def key(self, graphql_schema, document, query, operation_name, variables):
+        """Cache key for a query operation, or None when caching is off."""
+        if not self.ttl:
+            return None
+        digest, models = self.plan(graphql_schema, document, query)
+        versions = ",".join(f"{model._meta.label_lower}@{model_version(model)}" for model in models)
+        payload = json.dumps(
+            [digest, operation_name, variables or {}, versions], sort_keys=True, default=str
+        )
+        return f"crm:response:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def get(self, key):
+        return cache.get(key)
+
+    def set(self, key, data):
+        cache.set(key, data, self.ttl)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,185 @@
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .bulk import bulk_batch_size
+from .counting import bump_model_version
+from .models import Customer, DailyCrmRollup, DailyProductRollup, Order, OrderItem
+
+ONE_DAY = datetime.timedelta(days=1)
+CENTS = Decimal("0.01")
+
+
+def money(value):
+    # SQLite sums decimals as floats; round aggregates back to the column's scale
+    return None if value is None else Decimal(value).quantize(CENTS)
+
+
+def day_start(day):
+    """Aware datetime of local midnight at the start of `day`."""
+    return timezone.make_aware(
+        datetime.datetime.combine(day, datetime.time.min), timezone.get_current_timezone()
+    )
+
+
+def in_days(queryset, field, start=None, end=None):
+    """Filter `queryset` to rows whose `field` falls on local days start..end."""
+    if start is not None:
+        queryset = queryset.filter(**{f"{field}__gte": day_start(start)})
+    if end is not None:
+        queryset = queryset.filter(**{f"{field}__lt": day_start(end + ONE_DAY)})
+    return queryset
+
+
+def last_rollup_day():
+    return DailyCrmRollup.objects.aggregate(day=Max("day"))["day"]
+
+
+def pending_days(until=None):
+    """(start, end) of the finished days that have no rollup yet, or None."""
+    until = until or timezone.localdate() - ONE_DAY
+    last = last_rollup_day()
+    if last is not None:
+        start = last + ONE_DAY
+    else:
+        firsts = [
+            Order.objects.aggregate(first=Min("order_date"))["first"],
+            Customer.objects.aggregate(first=Min("created_at"))["first"],
+        ]
+        firsts = [first for first in firsts if first is not None]
+        if not firsts:
+            return None
+        start = timezone.localdate(min(firsts))
+    if start > until:
+        return None
+    return start, until
+
+
+def rollup_days(start, end):
+    """(Re)build the rollups of local days start..end; returns how many days were written.
+
+    Each table is read with one GROUP BY over the range, and every day gets a
+    DailyCrmRollup row even if nothing happened, so the last row marks how far
+    the rollups go.
+    """
+    orders = in_days(Order.objects.all(), "order_date", start, end)
+    totals = {
+        row["day"]: row
+        for row in orders.annotate(day=TruncDate("order_date"))
+        .values("day")
+        .annotate(order_count=Count("pk"), revenue=Sum("total_amount"))
+        .order_by()
+    }
+    new_customers = dict(
+        in_days(Customer.objects.all(), "created_at", start, end)
+        .annotate(day=TruncDate("created_at"))
+        .values("day")
+        .annotate(count=Count("pk"))
+        .order_by()
+        .values_list("day", "count")
+    )
+    lines = (
+        in_days(OrderItem.objects.all(), "order__order_date", start, end)
+        .annotate(day=TruncDate("order__order_date"))
+        .values("day", "product")
+        .annotate(units=Sum("quantity"), revenue=Sum(OrderItem.line_total()))
+        .order_by()
+    )
+
+    days = []
+    day = start
+    while day <= end:
+        row = totals.get(day, {})
+        days.append(DailyCrmRollup(
+            day=day,
+            new_customers=new_customers.get(day, 0),
+            order_count=row.get("order_count", 0),
+            revenue=money(row.get("revenue") or 0),
+        ))
+        day += ONE_DAY
+    products = [
+        DailyProductRollup(
+            day=line["day"],
+            product_id=line["product"],
+            units=line["units"],
+            revenue=money(line["revenue"]),
+        )
+        for line in lines
+    ]
+
+    batch_size = bulk_batch_size()
+    with transaction.atomic():
+        DailyCrmRollup.objects.filter(day__range=(start, end)).delete()
+        DailyProductRollup.objects.filter(day__range=(start, end)).delete()
+        DailyCrmRollup.objects.bulk_create(days, batch_size=batch_size)
+        DailyProductRollup.objects.bulk_create(products, batch_size=batch_size)
+    # bulk_create and queryset deletes skip the signals; invalidate cached reports
+    bump_model_version(DailyCrmRollup)
+    bump_model_version(DailyProductRollup)
+    return len(days)
+
+
+def refold_days(days):
+    """Rebuild the rollups of `days` that are already folded, e.g. after their orders were deleted.
+
+    One rollup_days() over the earliest..latest such day; days past the last
+    rollup are left for catch_up(). Returns how many days were written.
+    """
+    last = last_rollup_day()
+    days = [day for day in days if last is not None and day <= last]
+    if not days:
+        return 0
+    return rollup_days(min(days), max(days))
+
+
+def catch_up(refresh_days=0, until=None):
+    """Fold every finished day without a rollup, re-folding the last `refresh_days` too."""
+    pending = pending_days(until)
+    last = last_rollup_day()
+    if refresh_days and last is not None:
+        start = last - (refresh_days - 1) * ONE_DAY
+        pending = (start, pending[1] if pending else last)
+    if pending is None:
+        return 0
+    return rollup_days(*pending)
+
+
+def report_totals(start=None, end=None):
+    """New customers, orders and revenue for local days start..end (open-ended if None).
+
+    Rolled-up days are summed from DailyCrmRollup; only the days after the
+    last rollup (normally just today) are aggregated from Order rows, so the
+    cost follows the number of days rather than the number of orders.
+    """
+    rolled = DailyCrmRollup.objects.all()
+    if start is not None:
+        rolled = rolled.filter(day__gte=start)
+    if end is not None:
+        rolled = rolled.filter(day__lte=end)
+    totals = rolled.aggregate(
+        new_customers=Sum("new_customers"), order_count=Sum("order_count"), revenue=Sum("revenue")
+    )
+    totals = {
+        "new_customers": totals["new_customers"] or 0,
+        "order_count": totals["order_count"] or 0,
+        "revenue": totals["revenue"] or 0,
+    }
+
+    last = last_rollup_day()
+    live_start = start if last is None else max(start or last, last + ONE_DAY)
+    if end is None or live_start is None or live_start <= end:
+        live = in_days(Order.objects.all(), "order_date", live_start, end).aggregate(
+            order_count=Count("pk"), revenue=Sum("total_amount")
+        )
+        totals["order_count"] += live["order_count"]
+        totals["revenue"] += live["revenue"] or 0
+        totals["new_customers"] += in_days(
+            Customer.objects.all(), "created_at", live_start, end
+        ).count()
+
+    totals["revenue"] = money(totals["revenue"])
+    return totals
@@ -1,17 +1,39 @@
+from collections import defaultdict
+
 import graphene
 from graphene_django import DjangoObjectType
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Sum
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.utils import timezone
 from graphql import GraphQLError
+from graphql_relay import from_global_id
 
 # from crm.models import Product
 
-from .models import Customer, Product, Order
+from .bulk import bulk_batch_size, bulk_insert, chunked, lookup_in
+from .connections import CRMConnection, CRMConnectionField
+from .counting import bump_model_version
+from .customer_stats import record_orders
+from .entity_cache import bump_entity_generation, entity_cache, invalidate_entities
+from .inventory import InsufficientStock, place_order, reserve_stock
+from .loaders import get_loaders
+from .optimizer import optimize_connection
+from .models import Customer, DailyCrmRollup, DailyProductRollup, Product, Order, OrderItem
+from .rollups import money, report_totals
+from .search import SearchResults, index_objects, search_page_size
 
 
 # ---------------- GraphQL Types (Relay-Compatible) ----------------
-class CustomerType(DjangoObjectType):
+class CachedNodeMixin:
+    """Serve node(id:) lookups from the per-object entity cache."""
+
+    @classmethod
+    def get_node(cls, info, id):
+        return entity_cache.get(cls._meta.model, id)
+
+
+class CustomerType(CachedNodeMixin, DjangoObjectType):
     # Expose created_at as createdAt (camelCase) to match checker queries
     createdAt = graphene.DateTime(source="created_at")
 
@@ -19,29 +41,71 @@ class CustomerType(DjangoObjectType):
         model = Customer
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
+        connection_class = CRMConnection
 
 
-class ProductType(DjangoObjectType):
+class ProductType(CachedNodeMixin, DjangoObjectType):
     class Meta:
         model = Product
-        fields = "__all__"
+        # Order lines are reached through OrderType.items, which is batched
+        exclude = ("order_items",)
         interfaces = (graphene.relay.Node,)
+        connection_class = CRMConnection
+
+
+OrderStatus = graphene.Enum.from_enum(Order.Status, name="OrderStatus")
+
+
+class OrderItemType(DjangoObjectType):
+    line_total = graphene.Decimal(required=True)
+
+    class Meta:
+        model = OrderItem
+        fields = ("product", "quantity", "unit_price")
+
+    def resolve_line_total(self, info):
+        return money(self.quantity * self.unit_price)
 
 
-class OrderType(DjangoObjectType):
+class OrderType(CachedNodeMixin, DjangoObjectType):
     # Expose order_date as orderDate (camelCase)
     orderDate = graphene.DateTime(source="order_date")
+    status = graphene.Field(OrderStatus, required=True)
 
     # Add singular product for compatibility
     product = graphene.Field(ProductType)
+    # Lines with quantities and the prices they sold at
+    items = graphene.List(graphene.NonNull(OrderItemType), required=True)
+
+    # customer/products/product/items go through the per-request loaders so a
+    # page of orders costs one query per relation instead of one per node.
+    def resolve_customer(self, info):
+        if Order.customer.is_cached(self):
+            return self.customer
+        return get_loaders(info).customer.load(self.customer_id)
+
+    def resolve_items(self, info):
+        # Nested order connections prefetch the lines through the optimizer
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        if "items" in prefetched:
+            return sorted(prefetched["items"], key=lambda item: item.product_id)
+        return get_loaders(info).order_items.load(self.pk)
+
+    def resolve_products(self, info, **kwargs):
+        prefetched = getattr(self, "_prefetched_objects_cache", {})
+        if "products" in prefetched:
+            return prefetched["products"]
+        return [item.product for item in get_loaders(info).order_items.load(self.pk)]
 
     def resolve_product(self, info):
-        return self.products.first()
+        products = OrderType.resolve_products(self, info)
+        return min(products, key=lambda p: p.pk, default=None)
 
     class Meta:
         model = Order
         fields = "__all__"
         interfaces = (graphene.relay.Node,)
+        connection_class = CRMConnection
 
 
 # ---------------- Input Types (Mutations) ----------------
@@ -57,12 +121,39 @@ class ProductInput(graphene.InputObjectType):
     stock = graphene.Int(required=False, default_value=0)
 
 
+class OrderItemInput(graphene.InputObjectType):
+    product_id = graphene.ID(required=True)
+    quantity = graphene.Int(required=False, default_value=1)
+
+
 class OrderInput(graphene.InputObjectType):
     customer_id = graphene.ID(required=True)
-    product_ids = graphene.List(graphene.ID, required=True)
+    # One unit of each product; `items` carries quantities
+    product_ids = graphene.List(graphene.ID, required=False)
+    items = graphene.List(graphene.NonNull(OrderItemInput), required=False)
     order_date = graphene.DateTime(required=False)
 
 
+def to_pk(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def order_quantities(data):
+    """{product pk: quantity} of an OrderInput; unparseable ids map to None."""
+    quantities = defaultdict(int)
+    for product_id in data.product_ids or ():
+        # A repeated id is still one unit, as before quantities existed
+        quantities[to_pk(product_id)] = 1
+    for item in data.items or ():
+        if item.quantity is None or item.quantity < 1:
+            raise ValueError(f"Quantity must be at least 1 (product {item.product_id})")
+        quantities[to_pk(item.product_id)] += item.quantity
+    return dict(quantities)
+
+
 # ---------------- Filter Input Types (Task 3) ----------------
 class CustomerFilterInput(graphene.InputObjectType):
     nameIcontains = graphene.String()
@@ -71,6 +162,44 @@ class CustomerFilterInput(graphene.InputObjectType):
     createdAtLte = graphene.Date()
     # Challenge: custom phone pattern (e.g., starts with "+1")
     phonePattern = graphene.String()
+    # Denormalized order stats; sort on them with orderBy: ["-lifetime_value"]
+    hasOrders = graphene.Boolean()
+    orderCountGte = graphene.Int()
+    orderCountLte = graphene.Int()
+    lifetimeValueGte = graphene.Decimal()
+    lifetimeValueLte = graphene.Decimal()
+    lastOrderAtGte = graphene.DateTime()
+    lastOrderAtLte = graphene.DateTime()
+
+
+def filter_customers(qs, filter):
+    """Apply a CustomerFilterInput."""
+    if filter:
+        if filter.nameIcontains:
+            qs = qs.filter(name__icontains=filter.nameIcontains)
+        if filter.emailIcontains:
+            qs = qs.filter(email__icontains=filter.emailIcontains)
+        if filter.createdAtGte:
+            qs = qs.filter(created_at__gte=filter.createdAtGte)
+        if filter.createdAtLte:
+            qs = qs.filter(created_at__lte=filter.createdAtLte)
+        if filter.phonePattern:
+            qs = qs.filter(phone__startswith=filter.phonePattern)
+        if filter.hasOrders is not None:
+            qs = qs.filter(order_count__gt=0) if filter.hasOrders else qs.filter(order_count=0)
+        if filter.orderCountGte is not None:
+            qs = qs.filter(order_count__gte=filter.orderCountGte)
+        if filter.orderCountLte is not None:
+            qs = qs.filter(order_count__lte=filter.orderCountLte)
+        if filter.lifetimeValueGte is not None:
+            qs = qs.filter(lifetime_value__gte=filter.lifetimeValueGte)
+        if filter.lifetimeValueLte is not None:
+            qs = qs.filter(lifetime_value__lte=filter.lifetimeValueLte)
+        if filter.lastOrderAtGte:
+            qs = qs.filter(last_order_at__gte=filter.lastOrderAtGte)
+        if filter.lastOrderAtLte:
+            qs = qs.filter(last_order_at__lte=filter.lastOrderAtLte)
+    return qs
 
 
 class ProductFilterInput(graphene.InputObjectType):
@@ -83,6 +212,24 @@ class ProductFilterInput(graphene.InputObjectType):
     lowStockLt = graphene.Int()
 
 
+def filter_products(qs, filter):
+    """Apply a ProductFilterInput."""
+    if filter:
+        if filter.nameIcontains:
+            qs = qs.filter(name__icontains=filter.nameIcontains)
+        if filter.priceGte is not None:
+            qs = qs.filter(price__gte=filter.priceGte)
+        if filter.priceLte is not None:
+            qs = qs.filter(price__lte=filter.priceLte)
+        if filter.stockGte is not None:
+            qs = qs.filter(stock__gte=filter.stockGte)
+        if filter.stockLte is not None:
+            qs = qs.filter(stock__lte=filter.stockLte)
+        if filter.lowStockLt is not None:
+            qs = qs.filter(stock__lt=filter.lowStockLt)
+    return qs
+
+
 class OrderFilterInput(graphene.InputObjectType):
     totalAmountGte = graphene.Decimal()
     totalAmountLte = graphene.Decimal()
@@ -91,6 +238,41 @@ class OrderFilterInput(graphene.InputObjectType):
     customerName = graphene.String()     # via related field lookup
     productName = graphene.String()      # via related field lookup
     productId = graphene.ID()            # Challenge: orders including a specific product ID
+    status = OrderStatus()
+    reminded = graphene.Boolean()        # whether the reminder job has sent one
+
+
+def filter_orders(qs, filter):
+    """Apply an OrderFilterInput; product filters join the M2M and can repeat orders."""
+    if filter:
+        if filter.totalAmountGte is not None:
+            qs = qs.filter(total_amount__gte=filter.totalAmountGte)
+        if filter.totalAmountLte is not None:
+            qs = qs.filter(total_amount__lte=filter.totalAmountLte)
+        if filter.orderDateGte is not None:
+            qs = qs.filter(order_date__gte=filter.orderDateGte)
+        if filter.orderDateLte is not None:
+            qs = qs.filter(order_date__lte=filter.orderDateLte)
+        if filter.customerName:
+            qs = qs.filter(customer__name__icontains=filter.customerName)
+        if filter.productName:
+            qs = qs.filter(products__name__icontains=filter.productName)
+        if filter.productId:
+            qs = qs.filter(products__id=str(filter.productId))
+        if filter.status is not None:
+            qs = qs.filter(status=getattr(filter.status, "value", filter.status))
+        if filter.reminded is not None:
+            qs = qs.filter(reminded_at__isnull=not filter.reminded)
+    return qs
+
+
+def matching_orders(filter):
+    """Orders matching an OrderFilterInput, each once, for aggregates and exports."""
+    orders = filter_orders(Order.objects.all(), filter)
+    if filter and (filter.productName or filter.productId):
+        # A subquery instead of DISTINCT keeps the outer query free to aggregate or stream
+        orders = Order.objects.filter(pk__in=orders.values("pk"))
+    return orders
 
 
 # ---------------- Mutations (Task 1/2) ----------------
@@ -124,33 +306,70 @@ class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         # NOTE: we accept "input: [CustomerInput!]" to match the checker
         input = graphene.List(graphene.NonNull(CustomerInput), required=True)
+        batch_size = graphene.Int(required=False)
 
     customers = graphene.List(CustomerType)
     errors = graphene.List(graphene.String)
 
     @staticmethod
-    def mutate(root, info, input):
+    def mutate(root, info, input, batch_size=None):
         created_customers = []
         errors = []
 
+        # One email__in probe instead of an exists() per row
+        taken = set(lookup_in(
+            Customer.objects.values_list("email", flat=True),
+            "email",
+            {data.email for data in input},
+        ))
+
+        pending = []
+        for data in input:
+            if data.email in taken:
+                errors.append(f"Email already exists: {data.email}")
+                continue
+            customer = Customer(
+                name=data.name,
+                email=data.email,
+                phone=data.phone
+            )
+            try:
+                # Uniqueness was settled by the probe above, skip its per-row query
+                customer.full_clean(validate_unique=False)
+            except ValidationError as e:
+                errors.append(f"{data.email}: {str(e)}")
+                continue
+            # Later rows in the same batch with this email are duplicates too
+            taken.add(data.email)
+            pending.append(customer)
+
         with transaction.atomic():
-            for data in input:
+            for chunk in chunked(pending, bulk_batch_size(batch_size)):
                 try:
-                    if Customer.objects.filter(email=data.email).exists():
-                        errors.append(f"Email already exists: {data.email}")
-                        continue
-                    customer = Customer(
-                        name=data.name,
-                        email=data.email,
-                        phone=data.phone
-                    )
-                    customer.full_clean()
-                    customer.save()
-                    created_customers.append(customer)
-                except ValidationError as e:
-                    errors.append(f"{data.email}: {str(e)}")
-                except Exception:
-                    errors.append(f"{data.email}: Failed to create customer")
+                    with transaction.atomic():
+                        created_customers += Customer.objects.bulk_create(chunk)
+                except IntegrityError:
+                    # An email was taken concurrently since the probe: retry this
+                    # chunk row by row so only the clashing rows are reported
+                    for customer in chunk:
+                        try:
+                            with transaction.atomic():
+                                customer.save()
+                            created_customers.append(customer)
+                        except IntegrityError:
+                            errors.append(f"Email already exists: {customer.email}")
+                        except Exception:
+                            errors.append(f"{customer.email}: Failed to create customer")
+
+        if any(customer.pk is None for customer in created_customers):
+            # Backends that can't return ids from a bulk INSERT (MySQL)
+            created_customers = list(lookup_in(
+                Customer.objects.all(), "email", [c.email for c in created_customers]
+            ))
+        if created_customers:
+            # bulk_create skips post_save, so invalidate cached counts and index here
+            bump_model_version(Customer)
+            index_objects(created_customers, created=True)
 
         return BulkCreateCustomers(customers=created_customers, errors=errors)
 
@@ -194,146 +413,495 @@ class CreateOrder(graphene.Mutation):
                 customer = Customer.objects.get(pk=input.customer_id)
             except ObjectDoesNotExist:
                 raise GraphQLError("Invalid customer ID") from None
-
-            products = Product.objects.filter(pk__in=input.product_ids)
-            if not products.exists():
-                raise GraphQLError("No valid products found")
-            if products.count() != len(set(map(str, input.product_ids))):
-                # If any product id is invalid, count will differ
-                raise GraphQLError("Some product IDs are invalid")
-
-            order = Order.objects.create(
-                customer=customer,
-                order_date=input.order_date or timezone.now(),
-                total_amount=sum([p.price for p in products])
-            )
-            order.products.set(products)
-            order.save()
+            order, items = place_order(customer, order_quantities(input), input.order_date)
+            # The response's lines are the rows written above, in product pk order
+            get_loaders(info).order_items.set(order.pk, items)
             return CreateOrder(order=order)
         except Exception as e:
             raise GraphQLError(f"Failed to create order: {str(e)}") from None
 
 
+class BulkCreateOrders(graphene.Mutation):
+    class Arguments:
+        input = graphene.List(graphene.NonNull(OrderInput), required=True)
+        batch_size = graphene.Int(required=False)
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
+    @staticmethod
+    def mutate(root, info, input, batch_size=None):
+        batch_size = bulk_batch_size(batch_size)
+        errors = []
+
+        with transaction.atomic():
+            lines = []
+            for data in input:
+                try:
+                    lines.append(order_quantities(data))
+                except ValueError as e:
+                    lines.append(e)
+
+            # Two IN queries resolve every customer and product in the batch
+            customer_ids = set(lookup_in(
+                Customer.objects.values_list("pk", flat=True),
+                "pk",
+                {to_pk(data.customer_id) for data in input} - {None},
+            ))
+            products = {
+                product.pk: product
+                for product in lookup_in(
+                    Product.objects.select_for_update().only("pk", "name", "price", "stock").order_by("pk"),
+                    "pk",
+                    {pk for quantities in lines if isinstance(quantities, dict) for pk in quantities} - {None},
+                )
+            }
+
+            # Stock is handed out in input order; an order that doesn't fit is reported
+            remaining = {pk: product.stock for pk, product in products.items()}
+            taken = defaultdict(int)
+            orders, order_lines = [], []
+            for index, (data, quantities) in enumerate(zip(input, lines)):
+                if to_pk(data.customer_id) not in customer_ids:
+                    errors.append(f"Order {index}: Invalid customer ID")
+                    continue
+                if isinstance(quantities, ValueError):
+                    errors.append(f"Order {index}: {quantities}")
+                    continue
+                if not quantities:
+                    errors.append(f"Order {index}: No valid products found")
+                    continue
+                if not quantities.keys() <= products.keys():
+                    errors.append(f"Order {index}: Some product IDs are invalid")
+                    continue
+                short = [products[pk].name for pk in sorted(quantities) if remaining[pk] < quantities[pk]]
+                if short:
+                    errors.append(f"Order {index}: Insufficient stock for: {', '.join(short)}")
+                    continue
+                for pk, quantity in quantities.items():
+                    remaining[pk] -= quantity
+                    taken[pk] += quantity
+                orders.append(Order(
+                    customer_id=to_pk(data.customer_id),
+                    order_date=data.order_date or timezone.now(),
+                ))
+                order_lines.append(quantities)
+
+            bulk_insert(Order, orders, batch_size)
+            bulk_insert(
+                OrderItem,
+                [
+                    OrderItem(
+                        order_id=order.pk,
+                        product_id=pk,
+                        quantity=quantities[pk],
+                        unit_price=products[pk].price,
+                    )
+                    for order, quantities in zip(orders, order_lines)
+                    for pk in sorted(quantities)
+                ],
+                batch_size,
+                returning=False,
+            )
+            try:
+                # The rows are locked, so this only fails if a writer got past the lock
+                reserve_stock(taken)
+            except InsufficientStock as e:
+                raise GraphQLError(f"Failed to create orders: {e}") from None
+
+            # Totals are summed by the database, one UPDATE per batch, then read back
+            order_pks = [order.pk for order in orders]
+            for chunk in chunked(order_pks, batch_size):
+                Order.objects.filter(pk__in=chunk).update(total_amount=Order.items_total())
+            totals = dict(lookup_in(Order.objects.values_list("pk", "total_amount"), "pk", order_pks))
+            for order in orders:
+                order.total_amount = totals[order.pk]
+            # bulk_create skipped post_save, which adds single orders to the stats
+            record_orders(orders)
+
+        if orders:
+            # bulk_create and update() skip the signals, so invalidate caches here
+            bump_model_version(Order)
+            bump_model_version(OrderItem)
+            bump_model_version(Product)
+            invalidate_entities(Product, taken)
+            get_loaders(info).prime_orders(orders)
+
+        return BulkCreateOrders(orders=orders, errors=errors)
+
+
+# ---------------- Aggregates ----------------
+class ProductStatsType(graphene.ObjectType):
+    product = graphene.Field(ProductType)
+    order_count = graphene.Int()
+    units = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+def product_stats(rows, **counts):
+    """ProductStatsType per row of a `.values("product").annotate(...)` query."""
+    products = Product.objects.in_bulk([row["product"] for row in rows])
+    return [
+        ProductStatsType(
+            product=products[row["product"]],
+            revenue=money(row["revenue"]),
+            **{name: row[key] for name, key in counts.items()},
+        )
+        for row in rows
+    ]
+
+
+class CrmStatsType(graphene.ObjectType):
+    """Report figures computed in the database; each group runs only if selected."""
+
+    customer_count = graphene.Int()
+    # Distinct customers behind the matching orders
+    active_customer_count = graphene.Int()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    average_order_value = graphene.Decimal()
+    top_products = graphene.List(ProductStatsType, first=graphene.Int(default_value=5))
+
+    def __init__(self, orders):
+        super().__init__()
+        self.orders = orders
+        self._totals = None
+
+    def totals(self):
+        if self._totals is None:
+            self._totals = self.orders.aggregate(
+                order_count=Count("pk"),
+                revenue=Sum("total_amount"),
+                average_order_value=Avg("total_amount"),
+                active_customer_count=Count("customer", distinct=True),
+            )
+        return self._totals
+
+    def resolve_customer_count(self, info):
+        return Customer.objects.count()
+
+    def resolve_active_customer_count(self, info):
+        return self.totals()["active_customer_count"]
+
+    def resolve_order_count(self, info):
+        return self.totals()["order_count"]
+
+    def resolve_revenue(self, info):
+        return money(self.totals()["revenue"] or 0)
+
+    def resolve_average_order_value(self, info):
+        return money(self.totals()["average_order_value"])
+
+    def resolve_top_products(self, info, first=5):
+        if first <= 0:
+            return []
+        rows = list(
+            OrderItem.objects
+            .filter(order__in=self.orders.values("pk"))
+            .values("product")
+            .annotate(
+                order_count=Count("order"),
+                units=Sum("quantity"),
+                revenue=Sum(OrderItem.line_total()),
+            )
+            .order_by("-order_count", "-revenue", "product")[:first]
+        )
+        return product_stats(rows, order_count="order_count", units="units")
+
+
+class DailyCrmRollupType(DjangoObjectType):
+    class Meta:
+        model = DailyCrmRollup
+        fields = ("day", "new_customers", "order_count", "revenue")
+
+
+class CrmReportType(graphene.ObjectType):
+    """Report over local days dateFrom..dateTo, read from the daily rollups.
+
+    Totals include the days the rollup task hasn't reached yet (normally just
+    today); `days` and `topProducts` cover rolled-up days only.
+    """
+
+    new_customers = graphene.Int()
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    days = graphene.List(DailyCrmRollupType)
+    top_products = graphene.List(ProductStatsType, first=graphene.Int(default_value=5))
+
+    def __init__(self, date_from=None, date_to=None):
+        super().__init__()
+        self.date_from = date_from
+        self.date_to = date_to
+        self._totals = None
+
+    def in_range(self, queryset):
+        if self.date_from is not None:
+            queryset = queryset.filter(day__gte=self.date_from)
+        if self.date_to is not None:
+            queryset = queryset.filter(day__lte=self.date_to)
+        return queryset
+
+    def totals(self):
+        if self._totals is None:
+            self._totals = report_totals(self.date_from, self.date_to)
+        return self._totals
+
+    def resolve_new_customers(self, info):
+        return self.totals()["new_customers"]
+
+    def resolve_order_count(self, info):
+        return self.totals()["order_count"]
+
+    def resolve_revenue(self, info):
+        return self.totals()["revenue"]
+
+    def resolve_days(self, info):
+        return self.in_range(DailyCrmRollup.objects.all())
+
+    def resolve_top_products(self, info, first=5):
+        if first <= 0:
+            return []
+        rows = list(
+            self.in_range(DailyProductRollup.objects.all())
+            .values("product")
+            .annotate(units=Sum("units"), revenue=Sum("revenue"))
+            .order_by("-units", "-revenue", "product")[:first]
+        )
+        return product_stats(rows, units="units")
+
+
+# ---------------- Search ----------------
+class SearchKind(graphene.Enum):
+    CUSTOMER = "customer"
+    PRODUCT = "product"
+
+
+SEARCH_KIND_MODELS = {"customer": Customer, "product": Product}
+
+
+class SearchResult(graphene.Union):
+    class Meta:
+        types = (CustomerType, ProductType)
+
+
+class SearchResultConnection(graphene.relay.Connection):
+    class Meta:
+        node = SearchResult
+
+    class Edge:
+        # Higher is a better match; only comparable within one search
+        rank = graphene.Float(required=True)
+
+        def resolve_rank(self, info):
+            return self.node.search_rank
+
+
 # ---------------- Query (Task 3 with nested `filter`) ----------------
 class Query(graphene.ObjectType):
     # Relay connections that accept a nested "filter" arg and "orderBy"
-    all_customers = graphene.relay.ConnectionField(
+    all_customers = CRMConnectionField(
         CustomerType._meta.connection,
         filter=CustomerFilterInput(),
         order_by=graphene.List(of_type=graphene.String)
     )
-    all_products = graphene.relay.ConnectionField(
+    all_products = CRMConnectionField(
         ProductType._meta.connection,
         filter=ProductFilterInput(),
         order_by=graphene.List(of_type=graphene.String)
     )
-    all_orders = graphene.relay.ConnectionField(
+    all_orders = CRMConnectionField(
         OrderType._meta.connection,
         filter=OrderFilterInput(),
         order_by=graphene.List(of_type=graphene.String)
     )
+    node = graphene.relay.Node.Field()
+    # Several nodes at once: one cache round trip and one query per type for misses
+    nodes = graphene.List(
+        graphene.relay.Node, ids=graphene.List(graphene.NonNull(graphene.ID), required=True)
+    )
+    crm_stats = graphene.Field(CrmStatsType, filter=OrderFilterInput())
+    crm_report = graphene.Field(CrmReportType, date_from=graphene.Date(), date_to=graphene.Date())
+    # Ranked full-text search over customers and products, best match first
+    search = graphene.relay.ConnectionField(
+        SearchResultConnection,
+        query=graphene.String(required=True),
+        types=graphene.List(graphene.NonNull(SearchKind)),
+    )
 
     # --- Resolvers ---
+    def resolve_nodes(self, info, ids):
+        types = {t._meta.name: t for t in (CustomerType, ProductType, OrderType)}
+        keys = []
+        wanted = defaultdict(list)
+        for global_id in ids:
+            type_name, pk = from_global_id(global_id)
+            # Like a malformed pk, an unknown type (or undecodable id) is null in its slot
+            if type_name not in types:
+                keys.append(None)
+                continue
+            keys.append((type_name, pk))
+            wanted[type_name].append(pk)
+
+        found = {
+            type_name: entity_cache.get_many(types[type_name]._meta.model, pks)
+            for type_name, pks in wanted.items()
+        }
+        results = []
+        for key in keys:
+            if key is None:
+                results.append(None)
+                continue
+            type_name, pk = key
+            model = types[type_name]._meta.model
+            try:
+                results.append(found[type_name].get(model._meta.pk.to_python(pk)))
+            except ValidationError:
+                results.append(None)
+        return results
+
     def resolve_all_customers(self, info, filter=None, order_by=None, **kwargs):
-        qs = Customer.objects.all()
-
-        if filter:
-            if filter.nameIcontains:
-                qs = qs.filter(name__icontains=filter.nameIcontains)
-            if filter.emailIcontains:
-                qs = qs.filter(email__icontains=filter.emailIcontains)
-            if filter.createdAtGte:
-                qs = qs.filter(created_at__gte=filter.createdAtGte)
-            if filter.createdAtLte:
-                qs = qs.filter(created_at__lte=filter.createdAtLte)
-            if filter.phonePattern:
-                qs = qs.filter(phone__startswith=filter.phonePattern)
+        qs = filter_customers(Customer.objects.all(), filter)
 
         if order_by:
             qs = qs.order_by(*order_by)
 
-        return qs
+        return optimize_connection(qs, info)
 
     def resolve_all_products(self, info, filter=None, order_by=None, **kwargs):
-        qs = Product.objects.all()
-
-        if filter:
-            if filter.nameIcontains:
-                qs = qs.filter(name__icontains=filter.nameIcontains)
-            if filter.priceGte is not None:
-                qs = qs.filter(price__gte=filter.priceGte)
-            if filter.priceLte is not None:
-                qs = qs.filter(price__lte=filter.priceLte)
-            if filter.stockGte is not None:
-                qs = qs.filter(stock__gte=filter.stockGte)
-            if filter.stockLte is not None:
-                qs = qs.filter(stock__lte=filter.stockLte)
-            if filter.lowStockLt is not None:
-                qs = qs.filter(stock__lt=filter.lowStockLt)
+        qs = filter_products(Product.objects.all(), filter)
 
         if order_by:
             qs = qs.order_by(*order_by)
 
-        return qs
+        return optimize_connection(qs, info)
 
     def resolve_all_orders(self, info, filter=None, order_by=None, **kwargs):
-        qs = Order.objects.all()
-
-        if filter:
-            if filter.totalAmountGte is not None:
-                qs = qs.filter(total_amount__gte=filter.totalAmountGte)
-            if filter.totalAmountLte is not None:
-                qs = qs.filter(total_amount__lte=filter.totalAmountLte)
-            if filter.orderDateGte is not None:
-                qs = qs.filter(order_date__gte=filter.orderDateGte)
-            if filter.orderDateLte is not None:
-                qs = qs.filter(order_date__lte=filter.orderDateLte)
-            if filter.customerName:
-                qs = qs.filter(customer__name__icontains=filter.customerName)
-            if filter.productName:
-                qs = qs.filter(products__name__icontains=filter.productName)
-            if filter.productId:
-                qs = qs.filter(products__id=str(filter.productId))
+        # Deduplicated only when a product filter joins the M2M table
+        qs = matching_orders(filter)
 
         if order_by:
             qs = qs.order_by(*order_by)
 
-        # Distinct to avoid duplicates when joining products
-        return qs.distinct()
+        return optimize_connection(qs, info)
+
+    def resolve_crm_stats(self, info, filter=None):
+        return CrmStatsType(matching_orders(filter))
+
+    def resolve_crm_report(self, info, date_from=None, date_to=None):
+        return CrmReportType(date_from, date_to)
+
+    def resolve_search(self, info, query, types=None, **args):
+        if args.get("last") is not None or args.get("before") is not None:
+            raise GraphQLError("search only pages forward (first/after)")
+        if args.get("first") is None:
+            args["first"] = search_page_size()
+        models = None
+        if types is not None:
+            models = [SEARCH_KIND_MODELS[getattr(kind, "value", kind)] for kind in types]
+        # One LIMIT first+1 index query per page, no COUNT of the matches
+        return CRMConnectionField.forward_connection(
+            SearchResultConnection, args, SearchResults(query, models)
+        )
 
 
 # ---------------- New Mutation for Task 3 ----------------
 class UpdateLowStockProducts(graphene.Mutation):
+    class Arguments:
+        threshold = graphene.Int(required=False, default_value=10)
+        increment = graphene.Int(required=False, default_value=10)
+
     success = graphene.String()
-    updated_products = graphene.List(lambda: ProductType)
+    updated_count = graphene.Int()
+    # Paged with first/offset and read back in chunks, so a big restock never
+    # has to sit in memory as one list of model instances
+    updated_products = graphene.List(
+        lambda: ProductType,
+        first=graphene.Int(),
+        offset=graphene.Int(default_value=0),
+    )
+
+    def resolve_updated_count(self, info):
+        return len(self.updated_ids)
+
+    def resolve_updated_products(self, info, first=None, offset=0):
+        if (first is not None and first < 0) or offset is None or offset < 0:
+            raise GraphQLError("`first` and `offset` must be non-negative")
+        end = None if first is None else offset + first
+        return lookup_in(Product.objects.order_by("pk"), "pk", self.updated_ids[offset:end])
 
     @staticmethod
-    def mutate(root, info):
+    def mutate(root, info, threshold=10, increment=10):
+        if threshold < 0:
+            raise GraphQLError("Threshold cannot be negative")
+        if increment <= 0:
+            raise GraphQLError("Increment must be positive")
+
         try:
-            low_stock_products = Product.objects.filter(stock__lt=10)
-            updated = []
-
-            for product in low_stock_products:
-                product.stock += 10  # simulate restock
-                product.full_clean()
-                product.save()
-                updated.append(product)
-
-            return UpdateLowStockProducts(
-                success="Low-stock products updated successfully",
-                updated_products=updated,
-            )
+            low_stock = Product.objects.filter(stock__lt=threshold)
+            with transaction.atomic():
+                # Lock the rows, then update exactly that set by pk: re-filtering on
+                # stock would also catch rows that qualified after the read
+                updated_ids = list(
+                    low_stock.select_for_update().order_by("pk").values_list("pk", flat=True)
+                )
+                for chunk in chunked(updated_ids, bulk_batch_size()):
+                    Product.objects.filter(pk__in=chunk).update(stock=F("stock") + increment)  # simulate restock
+
+            if updated_ids:
+                # update() skips post_save, so invalidate cached counts and objects here
+                bump_model_version(Product)
+                bump_entity_generation(Product)
+
+            result = UpdateLowStockProducts(success="Low-stock products updated successfully")
+            result.updated_ids = updated_ids
+            return result
         except Exception as e:
             raise GraphQLError(f"Failed to update low-stock products: {str(e)}") from None
 
 
+class MarkOrdersReminded(graphene.Mutation):
+    """Stamp reminded_at on orders the reminder job has handled."""
+
+    class Arguments:
+        order_ids = graphene.List(graphene.NonNull(graphene.ID), required=True)
+
+    updated_count = graphene.Int()
+
+    @staticmethod
+    def mutate(root, info, order_ids):
+        pks = []
+        for order_id in order_ids:
+            # Accept the Relay ids the connection hands out as well as raw pks
+            type_name, pk = from_global_id(order_id)
+            if not type_name:
+                pk = order_id
+            elif type_name != OrderType._meta.name:
+                raise GraphQLError(f"Not an order ID: {order_id}")
+            if not str(pk).isdigit():
+                raise GraphQLError(f"Invalid order ID: {order_id}")
+            pks.append(int(pk))
+
+        updated = 0
+        for chunk in chunked(pks, bulk_batch_size()):
+            updated += Order.objects.filter(pk__in=chunk, reminded_at__isnull=True).update(
+                reminded_at=timezone.now()
+            )
+        if updated:
+            # update() skips post_save, so invalidate cached counts and objects here
+            bump_model_version(Order)
+            bump_entity_generation(Order)
+        return MarkOrdersReminded(updated_count=updated)
+
+
 # ---------------- Root Mutation ----------------
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
+    mark_orders_reminded = MarkOrdersReminded.Field()
 
 
 # ---------------- Schema ----------------
@@ -0,0 +1,231 @@
+import re
+from collections import defaultdict
+from functools import reduce
+from operator import and_, or_
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Q
+
+from .entity_cache import entity_cache
+from .models import Customer, Product
+
+# Results per page when a search doesn't pass `first`
+DEFAULT_SEARCH_PAGE_SIZE = 20
+DEFAULT_SEARCH_REINDEX_BATCH_SIZE = 1000
+
+# Created by migration 0008: an FTS5 table on SQLite, tsvector + GIN on Postgres
+SEARCH_TABLE = "crm_search"
+
+# model -> (kind code, indexed fields). An index row's key is
+# pk * KIND_SLOTS + kind, so one integer primary key (the FTS5 rowid) names
+# the object and updates/deletes are a key lookup, not a scan.
+SEARCHABLE = {
+    Customer: (1, ("name", "email")),
+    Product: (2, ("name",)),
+}
+KIND_SLOTS = 16
+
+_WORD = re.compile(r"\w+")
+# alias -> "fts5" / "tsvector" / None, looked up once per process
+_backends = {}
+
+
+def search_page_size():
+    return getattr(settings, "CRM_SEARCH_PAGE_SIZE", DEFAULT_SEARCH_PAGE_SIZE)
+
+
+def search_backend(using=DEFAULT_DB_ALIAS):
+    """Which text index `using` has, or None when migration 0008 couldn't build one."""
+    if using not in _backends:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            exists = SEARCH_TABLE in connection.introspection.table_names(cursor)
+        if not exists:
+            _backends[using] = None
+        elif connection.vendor == "postgresql":
+            _backends[using] = "tsvector"
+        else:
+            _backends[using] = "fts5"
+    return _backends[using]
+
+
+def index_key(model, pk):
+    return pk * KIND_SLOTS + SEARCHABLE[model][0]
+
+
+def search_text(obj):
+    """The indexed words of `obj`; e-mails split on @ and dots on every backend."""
+    _, fields = SEARCHABLE[type(obj)]
+    values = (getattr(obj, field) or "" for field in fields)
+    return " ".join(_WORD.findall(" ".join(values)))
+
+
+def terms(query):
+    return [term.lower() for term in _WORD.findall(query)]
+
+
+# ---------------- Index maintenance ----------------
+def index_objects(objs, using=DEFAULT_DB_ALIAS, created=False):
+    """Add or refresh index rows; crm.signals calls this on save, bulk writers directly.
+
+    `created` says none of `objs` is indexed yet, which saves the FTS5 delete.
+    """
+    backend = search_backend(using)
+    rows = [(index_key(type(obj), obj.pk), search_text(obj)) for obj in objs]
+    if backend is None or not rows:
+        return
+    with connections[using].cursor() as cursor:
+        if backend == "tsvector":
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_TABLE} (key, document) "
+                f"VALUES (%s, to_tsvector('simple', %s)) "
+                f"ON CONFLICT (key) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+        else:
+            # FTS5 has no upsert; both statements are rowid lookups
+            if not created:
+                cursor.executemany(
+                    f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(key,) for key, _ in rows]
+                )
+            cursor.executemany(f"INSERT INTO {SEARCH_TABLE} (rowid, body) VALUES (%s, %s)", rows)
+
+
+def unindex_objects(model, pks, using=DEFAULT_DB_ALIAS):
+    backend = search_backend(using)
+    if backend is None:
+        return
+    key_column = "key" if backend == "tsvector" else "rowid"
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {SEARCH_TABLE} WHERE {key_column} = %s",
+            [(index_key(model, pk),) for pk in pks],
+        )
+
+
+def rebuild_index(batch_size=None, using=DEFAULT_DB_ALIAS):
+    """Reindex every searchable row from scratch; returns how many were indexed.
+
+    For writes that bypass crm.signals (raw SQL, update() of a name). Runs in
+    one transaction, so searches keep seeing the old index until it commits.
+    """
+    backend = search_backend(using)
+    if backend is None:
+        return 0
+    batch_size = batch_size or getattr(
+        settings, "CRM_SEARCH_REINDEX_BATCH_SIZE", DEFAULT_SEARCH_REINDEX_BATCH_SIZE
+    )
+    total = 0
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        for model, (_, fields) in SEARCHABLE.items():
+            rows = model.objects.using(using).only("pk", *fields).order_by("pk")
+            batch = []
+            for obj in rows.iterator(chunk_size=batch_size):
+                batch.append(obj)
+                if len(batch) >= batch_size:
+                    index_objects(batch, using)
+                    total += len(batch)
+                    batch = []
+            index_objects(batch, using)
+            total += len(batch)
+    return total
+
+
+# ---------------- Queries ----------------
+def search_hits(query, models=None, offset=0, limit=None, using=DEFAULT_DB_ALIAS):
+    """[(model, pk, rank)] best match first; every query word matches as a prefix."""
+    words = terms(query)
+    models = list(SEARCHABLE if models is None else models)
+    if not words or not models:
+        return []
+    backend = search_backend(using)
+    if backend is None:
+        return _scan_hits(words, models, offset, limit, using)
+
+    kinds = {SEARCHABLE[model][0]: model for model in models}
+    kind_list = ", ".join(str(kind) for kind in sorted(kinds))
+    if limit is not None:
+        page = "LIMIT %s OFFSET %s"
+    else:
+        page = "LIMIT ALL OFFSET %s" if backend == "tsvector" else "LIMIT -1 OFFSET %s"
+    if backend == "tsvector":
+        sql = (
+            f"SELECT key, ts_rank_cd(document, q) AS score "
+            f"FROM {SEARCH_TABLE}, to_tsquery('simple', %s) q "
+            f"WHERE document @@ q AND key %% {KIND_SLOTS} IN ({kind_list}) "
+            f"ORDER BY score DESC, key {page}"
+        )
+        match = " & ".join(f"{word}:*" for word in words)
+    else:
+        # `rank` is FTS5's bm25() and sorts best first; negate it so higher is better
+        sql = (
+            f"SELECT rowid, -rank FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid %% {KIND_SLOTS} IN ({kind_list}) "
+            f"ORDER BY rank, rowid {page}"
+        )
+        # Quoted, so words are never read as FTS5 operators or column names
+        match = " ".join(f'"{word}"*' for word in words)
+    params = [match, offset] if limit is None else [match, limit, offset]
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            (kinds[key % KIND_SLOTS], key // KIND_SLOTS, float(score))
+            for key, score in cursor.fetchall()
+        ]
+
+
+def _scan_hits(words, models, offset, limit, using):
+    # No text index on this database: icontains per word, unranked, by type then pk
+    hits = []
+    stop = None if limit is None else offset + limit
+    for model in models:
+        _, fields = SEARCHABLE[model]
+        condition = reduce(and_, (
+            reduce(or_, (Q(**{f"{field}__icontains": word}) for field in fields))
+            for word in words
+        ))
+        pks = model.objects.using(using).filter(condition).order_by("pk").values_list("pk", flat=True)
+        if stop is not None:
+            pks = pks[:stop - len(hits)]
+        hits += [(model, pk, 0.0) for pk in pks]
+        if stop is not None and len(hits) >= stop:
+            break
+    return hits[offset:stop]
+
+
+class SearchResults:
+    """Lazily sliced search results, hydrated through the entity cache.
+
+    Slicing runs one ranked index query for that window and loads the objects
+    with one cache round trip (and at most one query per type for misses).
+    Each object carries its score as `search_rank`.
+    """
+
+    def __init__(self, query, models=None, using=DEFAULT_DB_ALIAS):
+        self.query = query
+        self.models = models
+        self.using = using
+
+    def __getitem__(self, window):
+        if not isinstance(window, slice) or window.step is not None:
+            raise TypeError("SearchResults only supports slices")
+        offset = window.start or 0
+        limit = None if window.stop is None else max(window.stop - offset, 0)
+        hits = search_hits(self.query, self.models, offset, limit, self.using)
+
+        wanted = defaultdict(list)
+        for model, pk, _ in hits:
+            wanted[model].append(pk)
+        found = {model: entity_cache.get_many(model, pks) for model, pks in wanted.items()}
+
+        results = []
+        for model, pk, rank in hits:
+            obj = found[model].get(pk)
+            # A row deleted after the index query is simply left out
+            if obj is not None:
+                obj.search_rank = rank
+                results.append(obj)
+        return results
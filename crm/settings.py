@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from celery.schedules import crontab
 
@@ -64,6 +65,10 @@ CELERY_BEAT_SCHEDULE = {
         "task": "crm.tasks.generate_crm_report",
         "schedule": crontab(day_of_week="mon", hour=6, minute=0),
     },
+    "rollup-crm-days": {
+        "task": "crm.tasks.rollup_crm_days",
+        "schedule": crontab(hour=0, minute=15),
+    },
 }
 
 
@@ -108,6 +113,30 @@ DATABASES = {
 }
 
 
+# Cache
+# Holds cached counts, model versions and GraphQL responses. Per process in
+# memory by default; set CRM_CACHE_URL to a local Redis-compatible server
+# (e.g. redis://127.0.0.1:6379/1, needs the redis package) to share them
+# between workers so a write in one invalidates the others. The response and
+# entity caches stay off until the cache is shared (or CRM_SHARED_CACHE = True
+# for a single-process deployment).
+
+CRM_CACHE_URL = os.environ.get("CRM_CACHE_URL")
+if CRM_CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CRM_CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -150,6 +179,10 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 GRAPHENE = {
-    "SCHEMA": "alx_backend_graphql_crm.schema.schema"
+    "SCHEMA": "alx_backend_graphql_crm.schema.schema",
+    "MIDDLEWARE": [
+        # Per-resolver wall time and SQL counts (histograms at /metrics)
+        "crm.instrumentation.ResolverTimingMiddleware",
+    ],
 }
 
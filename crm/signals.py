@@ -0,0 +1,126 @@
+from weakref import WeakKeyDictionary
+
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .counting import bump_model_version
+from .customer_stats import STATS_SOURCE_FIELDS, record_orders, recompute_stats
+from .entity_cache import invalidate_entity
+from .instrumentation import count_sql
+from .models import Customer, Product, Order, OrderItem
+from .rollups import refold_days
+from .search import SEARCHABLE, index_objects, unindex_objects
+
+
+# ---------------- Cached count invalidation ----------------
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_counts(sender, **kwargs):
+    bump_model_version(sender)
+
+
+# ---------------- Entity cache invalidation ----------------
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_entity(sender, instance, **kwargs):
+    invalidate_entity(sender, instance.pk)
+
+
+@receiver(m2m_changed, sender=OrderItem)
+def invalidate_order_product_counts(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_model_version(sender)
+
+
+# ---------------- Customer order stats ----------------
+# delete() origin -> customers losing orders in it, recomputed once per delete
+_stats_to_recompute = WeakKeyDictionary()
+
+
+@receiver(post_save, sender=Order)
+def update_customer_stats(sender, instance, created, raw, update_fields=None, **kwargs):
+    # Fixtures carry their customers' stats already. bulk_create skips this,
+    # so bulk writers call record_orders themselves.
+    if raw:
+        return
+    if created:
+        record_orders([instance])
+    elif update_fields is None or update_fields & STATS_SOURCE_FIELDS:
+        # Moved to another customer: the one it left needs recomputing too
+        previous = getattr(instance, "loaded_customer_id", None)
+        recompute_stats({instance.customer_id, previous} - {None})
+    instance.loaded_customer_id = instance.customer_id
+
+
+@receiver(pre_delete, sender=Order)
+def collect_customer_stats(sender, instance, origin, **kwargs):
+    # A customer's own delete takes its orders with it: nothing to recompute
+    deleting_customers = isinstance(origin, Customer) or (
+        isinstance(origin, QuerySet) and origin.model is Customer
+    )
+    if not deleting_customers:
+        _stats_to_recompute.setdefault(origin, set()).add(instance.customer_id)
+
+
+@receiver(post_delete, sender=Order)
+def recompute_customer_stats(sender, instance, origin, **kwargs):
+    # post_delete runs once every order of the delete is gone, so the first
+    # call recomputes all their customers in one UPDATE and the rest find nothing
+    customer_ids = _stats_to_recompute.pop(origin, None)
+    if customer_ids:
+        recompute_stats(customer_ids)
+
+
+# ---------------- Daily rollups ----------------
+# delete() origin -> local days that lost orders in it, refolded once per delete
+_days_to_refold = WeakKeyDictionary()
+
+
+@receiver(pre_delete, sender=Order)
+def collect_rollup_days(sender, instance, origin, **kwargs):
+    _days_to_refold.setdefault(origin, set()).add(timezone.localdate(instance.order_date))
+
+
+@receiver(post_delete, sender=Order)
+def refold_rollup_days(sender, instance, origin, **kwargs):
+    # As with the stats: every order of the delete is gone by the first call
+    days = _days_to_refold.pop(origin, None)
+    if days:
+        refold_days(days)
+
+
+# ---------------- Search index ----------------
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+def index_for_search(sender, instance, created, using, update_fields=None, **kwargs):
+    # e.g. a save(update_fields=["stock"]) leaves the indexed text alone
+    if update_fields and not update_fields & set(SEARCHABLE[sender][1]):
+        return
+    index_objects([instance], using, created=created)
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+def unindex_for_search(sender, instance, using, **kwargs):
+    unindex_objects(sender, [instance.pk], using)
+
+
+# ---------------- Resolver instrumentation ----------------
+@receiver(connection_created)
+def install_sql_counter(sender, connection, **kwargs):
+    # execute_wrappers outlives reconnects, so only add it once
+    if count_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_sql)
@@ -3,46 +3,49 @@
 from datetime import datetime   # ✅ checker requirement
 import requests                 # ✅ checker requirement (even if unused)
 from celery import shared_task
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+
+from .cleanup import clean_inactive_customers
+from .local import execute_local
+from .rollups import catch_up
+
+# Customers are one live COUNT; orders and revenue are summed from the daily
+# rollups (plus the days not rolled up yet), so the cost grows with days
+REPORT_QUERY = """
+query {
+  crmStats {
+    customerCount
+  }
+  crmReport {
+    orderCount
+    revenue
+  }
+}
+"""
+
+
+@shared_task
+def rollup_crm_days(refresh_days=1):
+    """Fold finished days into the daily rollups; re-folds the last one in case of late edits."""
+    return catch_up(refresh_days=refresh_days)
+
+
+@shared_task
+def clean_inactive_customers_task(days=365, dry_run=False):
+    """Batched, resumable inactive-customer cleanup (see crm.cleanup)."""
+    return clean_inactive_customers(days=days, dry_run=dry_run)
+
 
 @shared_task
 def generate_crm_report():   # ✅ checker expects no underscore in name
-    # GraphQL client setup
-    transport = RequestsHTTPTransport(
-        url="http://localhost:8000/graphql",
-        verify=False,
-        retries=3,
-    )
-    client = Client(transport=transport, fetch_schema_from_transport=True)
-
-    # GraphQL query
-    query = gql("""
-    query {
-      allCustomers {
-        totalCount
-      }
-      allOrders {
-        totalCount
-        edges {
-          node {
-            totalAmount
-          }
-        }
-      }
-    }
-    """)
-
-    result = client.execute(query)
-
-    total_customers = result["allCustomers"]["totalCount"]
-    total_orders = result["allOrders"]["totalCount"]
-
-    # Sum revenue from order edges
-    revenue = sum(
-        float(order["node"]["totalAmount"]) 
-        for order in result["allOrders"]["edges"]
-    )
+    # Make sure every finished day is rolled up, so only today is read from orders
+    catch_up()
+
+    # Executed in the worker against the schema: no web tier or introspection needed
+    result = execute_local(REPORT_QUERY)
+
+    total_customers = result["crmStats"]["customerCount"]
+    total_orders = result["crmReport"]["orderCount"]
+    revenue = float(result["crmReport"]["revenue"])
 
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # ✅ matches checker
     log_line = f"{timestamp} - Report: {total_customers} customers, {total_orders} orders, {revenue} revenue\n"
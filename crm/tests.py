@@ -1,3 +1,1170 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql_relay import to_global_id
+
+from graphql_crm.schema import schema as legacy_schema
+
+from . import cron, tasks
+from .cleanup import CHECKPOINT_NAME, clean_inactive_customers
+from .document_cache import DocumentCache
+from .entity_cache import entity_cache
+from .local import LocalExecutionError, execute_local
+from .management.commands.register_persisted_queries import REMINDERS_SCRIPT, load_script
+from .models import (
+    Customer,
+    DailyCrmRollup,
+    DailyProductRollup,
+    JobCheckpoint,
+    Order,
+    OrderItem,
+    PersistedQuery,
+    Product,
+)
+from .persisted import CachedQueryStore, DatabaseQueryStore, query_hash
+from .rollups import catch_up
+from .schema import schema
+
+
+def make_orders(count):
+    products = [
+        Product.objects.create(name=f"Product {i}", price=Decimal("9.99"), stock=5)
+        for i in range(3)
+    ]
+    start = Customer.objects.count()
+    for i in range(start, start + count):
+        customer = Customer.objects.create(name=f"Customer {i}", email=f"c{i}@example.com")
+        order = Order.objects.create(customer=customer, total_amount=Decimal("29.97"))
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, product=p, unit_price=p.price) for p in products]
+        )
+
+
+class GraphQLTestMixin:
+    def setUp(self):
+        # Cached counts and responses would outlive each test's rolled-back data
+        cache.clear()
+
+    def graphql(self, query, variables=None):
+        response = self.client.post(
+            "/graphql",
+            json.dumps({"query": query, "variables": variables or {}}),
+            content_type="application/json",
+        )
+        return response.json()
+
+
+class OrderLoaderTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    query ($first: Int) {
+      allOrders(first: $first) {
+        edges {
+          node {
+            customer { name }
+            product { name }
+            products { edges { node { name } } }
+          }
+        }
+      }
+    }
+    """
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        make_orders(20)
+        for first in (2, 20):
+            # page (customer joined) + products prefetch
+            with self.assertNumQueries(2):
+                result = self.graphql(self.QUERY, {"first": first})
+            self.assertNotIn("errors", result)
+            edges = result["data"]["allOrders"]["edges"]
+            self.assertEqual(len(edges), first)
+            node = edges[0]["node"]
+            self.assertEqual(node["product"]["name"], "Product 0")
+            self.assertEqual(len(node["products"]["edges"]), 3)
+
+
+class QueryOptimizerTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    query {
+      allCustomers(first: 10) {
+        edges {
+          node {
+            name
+            orders(first: 5) { edges { node { totalAmount ...OrderProducts } } }
+          }
+        }
+      }
+    }
+    fragment OrderProducts on OrderType {
+      products(first: 5) { edges { node { name } } }
+    }
+    """
+
+    def test_nested_connections_are_prefetched_with_narrow_columns(self):
+        make_orders(10)
+        # customers + orders prefetch + products prefetch
+        with CaptureQueriesContext(connection) as queries:
+            result = self.graphql(self.QUERY)
+        self.assertNotIn("errors", result)
+        self.assertEqual(len(queries), 3)
+        edges = result["data"]["allCustomers"]["edges"]
+        self.assertEqual(len(edges), 10)
+        order = edges[0]["node"]["orders"]["edges"][0]["node"]
+        self.assertEqual(len(order["products"]["edges"]), 3)
+        customer_sql = queries.captured_queries[0]["sql"]
+        self.assertNotIn('"email"', customer_sql)
+
+    def test_nested_order_items_are_prefetched(self):
+        make_orders(5)
+        for customer in Customer.objects.all():
+            order = Order.objects.create(customer=customer, total_amount=Decimal("2.00"))
+            OrderItem.objects.create(
+                order=order, product=Product.objects.get(name="Product 1"), quantity=2, unit_price=Decimal("1.00")
+            )
+        query = """
+        { allCustomers(first: 5) { edges { node { orders(first: 2) { edges { node {
+            items { quantity lineTotal product { name } }
+        } } } } } } }
+        """
+        # customers + orders prefetch + items prefetch (products joined)
+        with self.assertNumQueries(3):
+            result = self.graphql(query)
+        self.assertNotIn("errors", result)
+        orders = [edge["node"]["orders"]["edges"] for edge in result["data"]["allCustomers"]["edges"]]
+        self.assertEqual([len(o) for o in orders], [2] * 5)
+        self.assertEqual(
+            [line["product"]["name"] for line in orders[0][0]["node"]["items"]],
+            ["Product 0", "Product 1", "Product 2"],
+        )
+        self.assertEqual(orders[0][1]["node"]["items"], [
+            {"quantity": 2, "lineTotal": "2.00", "product": {"name": "Product 1"}},
+        ])
+
+
+class KeysetPaginationTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    query ($after: String, $before: String, $first: Int, $last: Int) {
+      allProducts(keyset: true, orderBy: ["-price", "name"], first: $first,
+                  last: $last, after: $after, before: $before) {
+        pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+        edges { node { name } }
+      }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        for i in range(7):
+            # Pairs of equal prices exercise the tie-breaking columns
+            Product.objects.create(name=f"P{i}", price=Decimal(10 + i // 2), stock=1)
+        self.expected = list(
+            Product.objects.order_by("-price", "name", "pk").values_list("name", flat=True)
+        )
+
+    def names(self, connection):
+        return [edge["node"]["name"] for edge in connection["edges"]]
+
+    def test_walks_forward_and_backward_through_all_pages(self):
+        seen, after = [], None
+        while True:
+            result = self.graphql(self.QUERY, {"first": 3, "after": after})
+            self.assertNotIn("errors", result)
+            page = result["data"]["allProducts"]
+            seen += self.names(page)
+            if not page["pageInfo"]["hasNextPage"]:
+                break
+            after = page["pageInfo"]["endCursor"]
+        self.assertEqual(seen, self.expected)
+
+        # `after` is now the end cursor of the second page (expected[5])
+        page = self.graphql(self.QUERY, {"last": 2, "before": after})["data"]["allProducts"]
+        self.assertEqual(self.names(page), self.expected[3:5])
+        self.assertTrue(page["pageInfo"]["hasPreviousPage"])
+
+    def test_deep_page_does_not_use_offset(self):
+        page = self.graphql(self.QUERY, {"first": 4})["data"]["allProducts"]
+        with CaptureQueriesContext(connection) as queries:
+            self.graphql(self.QUERY, {"first": 2, "after": page["pageInfo"]["endCursor"]})
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("OFFSET", queries.captured_queries[0]["sql"])
+
+
+class TotalCountTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    query ($strategy: CountStrategy) {
+      allOrders(filter: {productName: "Product"}) { totalCount(strategy: $strategy) }
+    }
+    """
+
+    def count(self, strategy):
+        result = self.graphql(self.QUERY, {"strategy": strategy})
+        self.assertNotIn("errors", result)
+        return result["data"]["allOrders"]["totalCount"]
+
+    def test_strategies_agree_on_distinct_orders(self):
+        make_orders(4)
+        for strategy in ("EXACT", "CACHED", "ESTIMATED"):
+            self.assertEqual(self.count(strategy), 4)
+
+    def test_cached_count_is_invalidated_by_saves(self):
+        make_orders(2)
+        self.assertEqual(self.count("CACHED"), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.count("CACHED"), 2)
+        make_orders(1)
+        self.assertEqual(self.count("CACHED"), 3)
+
+
+class BulkCreateCustomersTests(GraphQLTestMixin, TestCase):
+    MUTATION = """
+    mutation ($input: [CustomerInput!]!) {
+      bulkCreateCustomers(input: $input, batchSize: 2) { customers { id email } errors }
+    }
+    """
+
+    def test_reports_the_same_per_row_errors(self):
+        Customer.objects.create(name="Old", email="old@example.com")
+        rows = [
+            {"name": "A", "email": "a@example.com"},
+            {"name": "Old again", "email": "old@example.com"},
+            {"name": "Bad phone", "email": "bad@example.com", "phone": "nope"},
+            {"name": "A twice", "email": "a@example.com"},
+            {"name": "B", "email": "b@example.com"},
+            {"name": "C", "email": "c@example.com"},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            result = self.graphql(self.MUTATION, {"input": rows})
+        self.assertNotIn("errors", result)
+        statements = [
+            q["sql"] for q in queries.captured_queries if "SAVEPOINT" not in q["sql"]
+        ]
+        # one email probe + one INSERT per batch of two + one search index INSERT
+        self.assertEqual(len(statements), 4)
+        data = result["data"]["bulkCreateCustomers"]
+        self.assertEqual(
+            [c["email"] for c in data["customers"]],
+            ["a@example.com", "b@example.com", "c@example.com"],
+        )
+        self.assertTrue(all(c["id"] for c in data["customers"]))
+        self.assertEqual(len(data["errors"]), 3)
+        self.assertEqual(data["errors"][0], "Email already exists: old@example.com")
+        self.assertTrue(data["errors"][1].startswith("bad@example.com: "))
+        self.assertEqual(data["errors"][2], "Email already exists: a@example.com")
+
+
+class UpdateLowStockProductsTests(GraphQLTestMixin, TestCase):
+    MUTATION = """
+    mutation {
+      updateLowStockProducts(threshold: 5, increment: 20) {
+        success
+        updatedCount
+        updatedProducts(first: 2, offset: 1) { name stock }
+      }
+    }
+    """
+
+    def test_restocks_with_one_update(self):
+        for i in range(4):
+            Product.objects.create(name=f"Low {i}", price=Decimal("1.00"), stock=i)
+        Product.objects.create(name="Full", price=Decimal("1.00"), stock=50)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = self.graphql(self.MUTATION)
+        self.assertNotIn("errors", result)
+        updates = [q for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+        data = result["data"]["updateLowStockProducts"]
+        self.assertEqual(data["updatedCount"], 4)
+        self.assertEqual(
+            data["updatedProducts"],
+            [{"name": "Low 1", "stock": 21}, {"name": "Low 2", "stock": 22}],
+        )
+        self.assertEqual(Product.objects.get(name="Full").stock, 50)
+
+    def test_negative_page_arguments_are_rejected(self):
+        Product.objects.create(name="Low", price=Decimal("1.00"), stock=1)
+        for page in ("first: -1", "offset: -1"):
+            result = self.graphql(
+                f"mutation {{ updateLowStockProducts {{ updatedProducts({page}) {{ name }} }} }}"
+            )
+            self.assertIn("must be non-negative", result["errors"][0]["message"])
+
+
+class CreateOrderTests(GraphQLTestMixin, TestCase):
+    MUTATION = """
+    mutation ($input: OrderInput!) {
+      createOrder(input: $input) { order { totalAmount products { edges { node { name } } } } }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.products = [
+            Product.objects.create(name=f"P{i}", price=Decimal("2.50"), stock=3)
+            for i in range(3)
+        ]
+
+    def test_creates_order_with_one_product_read_and_one_through_insert(self):
+        ids = [str(p.pk) for p in self.products]
+        with CaptureQueriesContext(connection) as queries:
+            result = self.graphql(self.MUTATION, {"input": {"customerId": str(self.customer.pk), "productIds": ids}})
+        self.assertNotIn("errors", result)
+        self.assertEqual(result["data"]["createOrder"]["order"]["totalAmount"], "7.50")
+        sql = [q["sql"] for q in queries.captured_queries]
+        self.assertEqual(len([s for s in sql if 'FROM "crm_product"' in s and "orderitem" not in s]), 1)
+        self.assertEqual(len([s for s in sql if s.startswith('INSERT INTO "crm_orderitem"')]), 1)
+        self.assertEqual(Order.objects.get().products.count(), 3)
+
+    def test_rejects_unknown_product_ids(self):
+        ids = [str(self.products[0].pk), "999999"]
+        result = self.graphql(self.MUTATION, {"input": {"customerId": str(self.customer.pk), "productIds": ids}})
+        self.assertIn("Some product IDs are invalid", result["errors"][0]["message"])
+        self.assertFalse(Order.objects.exists())
+
+
+class BulkCreateOrdersTests(GraphQLTestMixin, TestCase):
+    MUTATION = """
+    mutation ($input: [OrderInput!]!) {
+      bulkCreateOrders(input: $input, batchSize: 2) {
+        orders { totalAmount customer { name } product { name } }
+        errors
+      }
+    }
+    """
+
+    def test_creates_valid_orders_and_reports_bad_items(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        p1 = Product.objects.create(name="P1", price=Decimal("1.25"), stock=2)
+        p2 = Product.objects.create(name="P2", price=Decimal("2.00"), stock=2)
+        cid = str(customer.pk)
+        items = [
+            {"customerId": cid, "productIds": [str(p1.pk), str(p2.pk)]},
+            {"customerId": "999999", "productIds": [str(p1.pk)]},
+            {"customerId": cid, "productIds": [str(p2.pk), "999999"]},
+            {"customerId": cid, "productIds": [str(p2.pk)]},
+            {"customerId": cid, "productIds": [str(p1.pk)]},
+        ]
+        result = self.graphql(self.MUTATION, {"input": items})
+        self.assertNotIn("errors", result)
+        data = result["data"]["bulkCreateOrders"]
+        self.assertEqual(
+            data["errors"],
+            ["Order 1: Invalid customer ID", "Order 2: Some product IDs are invalid"],
+        )
+        self.assertEqual([o["totalAmount"] for o in data["orders"]], ["3.25", "2.00", "1.25"])
+        self.assertEqual(data["orders"][0]["product"]["name"], "P1")
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(OrderItem.objects.count(), 4)
+        # Exactly the stock there was, taken by the created orders only
+        self.assertEqual(list(Product.objects.order_by("pk").values_list("stock", flat=True)), [0, 0])
+
+
+class OrderItemTests(GraphQLTestMixin, TestCase):
+    MUTATION = """
+    mutation ($input: OrderInput!) {
+      createOrder(input: $input) {
+        order { totalAmount items { quantity unitPrice lineTotal product { name } } }
+      }
+    }
+    """
+    BULK = """
+    mutation ($input: [OrderInput!]!) {
+      bulkCreateOrders(input: $input) { orders { totalAmount } errors }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10)
+        self.ink = Product.objects.create(name="Ink", price=Decimal("4.00"), stock=2)
+
+    def order(self, *items, product_ids=()):
+        return self.graphql(self.MUTATION, {"input": {
+            "customerId": str(self.customer.pk),
+            "productIds": [str(pk) for pk in product_ids],
+            "items": [{"productId": str(p.pk), "quantity": q} for p, q in items],
+        }})
+
+    def stock(self):
+        return list(Product.objects.order_by("pk").values_list("stock", flat=True))
+
+    def test_quantities_prices_and_stock(self):
+        result = self.order((self.pen, 3), (self.ink, 2))
+        self.assertNotIn("errors", result)
+        order = result["data"]["createOrder"]["order"]
+        self.assertEqual(order["totalAmount"], "12.50")
+        self.assertEqual(
+            [(i["product"]["name"], i["quantity"], i["unitPrice"], i["lineTotal"]) for i in order["items"]],
+            [("Pen", 3, "1.50", "4.50"), ("Ink", 2, "4.00", "8.00")],
+        )
+        self.assertEqual(self.stock(), [7, 0])
+
+        # Lines keep the price they sold at; totals are re-summed from them in SQL
+        Product.objects.filter(pk=self.pen.pk).update(price=Decimal("9.99"))
+        saved = Order.objects.get()
+        saved.total_amount = Decimal("0")
+        saved.calculate_total_amount()
+        self.assertEqual(saved.total_amount, Decimal("12.50"))
+        self.assertEqual(Customer.objects.get().lifetime_value, Decimal("12.50"))
+
+    def test_short_stock_rejects_the_whole_order(self):
+        result = self.order((self.pen, 1), (self.ink, 3))
+        self.assertIn("Insufficient stock for: Ink", result["errors"][0]["message"])
+        self.assertIn("at least 1", self.order((self.pen, 0))["errors"][0]["message"])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.stock(), [10, 2])
+
+    def test_legacy_schema_places_orders_the_same_way(self):
+        result = legacy_schema.execute(
+            "mutation ($input: OrderInput!) { createOrder(input: $input) { order { totalAmount } } }",
+            variable_values={"input": {
+                "customerId": str(self.customer.pk),
+                "productIds": [str(self.pen.pk), str(self.ink.pk)],
+            }},
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["createOrder"]["order"]["totalAmount"], "5.50")
+        self.assertEqual(self.stock(), [9, 1])
+        customer = Customer.objects.get()
+        self.assertEqual((customer.order_count, customer.lifetime_value), (1, Decimal("5.50")))
+
+    def test_bulk_hands_out_stock_in_input_order(self):
+        cid = str(self.customer.pk)
+        line = lambda product, quantity: {"productId": str(product.pk), "quantity": quantity}
+        result = self.graphql(self.BULK, {"input": [
+            {"customerId": cid, "items": [line(self.ink, 1), line(self.pen, 2)]},
+            {"customerId": cid, "items": [line(self.ink, 2)]},
+            {"customerId": cid, "items": [line(self.pen, 0)]},
+            {"customerId": cid, "productIds": [str(self.ink.pk)]},
+        ]})
+        data = result["data"]["bulkCreateOrders"]
+        self.assertEqual(data["errors"][0], "Order 1: Insufficient stock for: Ink")
+        self.assertTrue(data["errors"][1].startswith("Order 2: Quantity must be at least 1"))
+        self.assertEqual([o["totalAmount"] for o in data["orders"]], ["7.00", "4.00"])
+        self.assertEqual(self.stock(), [8, 0])
+
+        stats = self.graphql("{ crmStats { topProducts { product { name } orderCount units revenue } } }")
+        self.assertEqual(
+            stats["data"]["crmStats"]["topProducts"],
+            [
+                {"product": {"name": "Ink"}, "orderCount": 2, "units": 2, "revenue": "8.00"},
+                {"product": {"name": "Pen"}, "orderCount": 1, "units": 2, "revenue": "3.00"},
+            ],
+        )
+
+
+class CustomerOrderStatsTests(GraphQLTestMixin, TestCase):
+    CUSTOMERS = """
+    query ($filter: CustomerFilterInput) {
+      allCustomers(filter: $filter, orderBy: ["-lifetime_value", "id"]) {
+        edges { node { name orderCount lifetimeValue lastOrderAt } }
+      }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.ada = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        Customer.objects.create(name="Cy", email="cy@example.com")
+        self.p1 = Product.objects.create(name="P1", price=Decimal("1.25"), stock=5)
+        self.p2 = Product.objects.create(name="P2", price=Decimal("2.00"), stock=5)
+
+    def customers(self, **filter):
+        result = self.graphql(self.CUSTOMERS, {"filter": filter})
+        self.assertNotIn("errors", result)
+        return [edge["node"] for edge in result["data"]["allCustomers"]["edges"]]
+
+    def test_order_mutations_keep_stats_current(self):
+        self.graphql(
+            "mutation ($input: OrderInput!) { createOrder(input: $input) { order { id } } }",
+            {"input": {"customerId": str(self.bob.pk), "productIds": [str(self.p1.pk)]}},
+        )
+        self.graphql(
+            "mutation ($input: [OrderInput!]!) { bulkCreateOrders(input: $input) { errors } }",
+            {"input": [
+                {"customerId": str(self.ada.pk), "productIds": [str(self.p1.pk), str(self.p2.pk)]},
+                {"customerId": str(self.ada.pk), "productIds": [str(self.p2.pk)]},
+            ]},
+        )
+        with self.assertNumQueries(1):
+            rows = self.customers(hasOrders=True)
+        self.assertEqual(
+            [(c["name"], c["orderCount"], c["lifetimeValue"]) for c in rows],
+            [("Ada", 2, "5.25"), ("Bob", 1, "1.25")],
+        )
+        latest = Order.objects.filter(customer=self.ada).latest("order_date").order_date
+        self.assertEqual(Customer.objects.get(pk=self.ada.pk).last_order_at, latest)
+        self.assertEqual([c["name"] for c in self.customers(lifetimeValueGte="2")], ["Ada"])
+        self.assertEqual([c["name"] for c in self.customers(orderCountLte=1)], ["Bob", "Cy"])
+        self.assertEqual([c["name"] for c in self.customers(hasOrders=False)], ["Cy"])
+
+        Order.objects.filter(customer=self.ada).earliest("order_date").delete()
+        ada = Customer.objects.get(pk=self.ada.pk)
+        self.assertEqual((ada.order_count, ada.lifetime_value), (1, Decimal("2.00")))
+
+    def test_orm_writes_keep_stats_current(self):
+        first = Order.objects.create(customer=self.ada, total_amount=Decimal("3.00"))
+        Order.objects.create(customer=self.ada, total_amount=Decimal("4.00"))
+        Order.objects.create(customer=self.bob, total_amount=Decimal("1.00"))
+        first.total_amount = Decimal("5.00")
+        first.save()
+        ada = Customer.objects.get(pk=self.ada.pk)
+        self.assertEqual((ada.order_count, ada.lifetime_value), (2, Decimal("9.00")))
+
+        # Moving an order recomputes the customer it left as well
+        moved = Order.objects.get(pk=first.pk)
+        moved.customer = self.bob
+        moved.save()
+        ada, bob = Customer.objects.get(pk=self.ada.pk), Customer.objects.get(pk=self.bob.pk)
+        self.assertEqual((ada.order_count, ada.lifetime_value), (1, Decimal("4.00")))
+        self.assertEqual((bob.order_count, bob.lifetime_value), (2, Decimal("6.00")))
+
+        # One recompute for the whole delete, none when the customer goes too
+        with CaptureQueriesContext(connection) as queries:
+            Order.objects.filter(customer__in=[self.ada, self.bob]).delete()
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "crm_customer"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            list(Customer.objects.filter(pk__in=[self.ada.pk, self.bob.pk]).values_list("order_count", flat=True)),
+            [0, 0],
+        )
+        Order.objects.create(customer=self.ada, total_amount=Decimal("1.00"))
+        Order.objects.create(customer=self.ada, total_amount=Decimal("1.00"))
+        with CaptureQueriesContext(connection) as queries:
+            Customer.objects.get(pk=self.ada.pk).delete()
+        self.assertFalse(any(q["sql"].startswith('UPDATE "crm_customer"') for q in queries.captured_queries))
+
+    def test_repair_command_recomputes_in_batches(self):
+        order = Order.objects.create(customer=self.ada, total_amount=Decimal("9.00"))
+        Customer.objects.filter(pk=self.bob.pk).update(order_count=7, lifetime_value=Decimal("70"))
+        out = StringIO()
+        call_command("repair_customer_stats", batch_size=2, stdout=out)
+        self.assertIn("Recomputed 3 customers", out.getvalue())
+        self.assertEqual(
+            list(Customer.objects.order_by("pk").values_list("order_count", "lifetime_value", "last_order_at")),
+            [(1, Decimal("9.00"), order.order_date), (0, Decimal("0"), None), (0, Decimal("0"), None)],
+        )
+
+
+class CrmStatsTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    query ($filter: OrderFilterInput) {
+      crmStats(filter: $filter) {
+        customerCount activeCustomerCount orderCount revenue averageOrderValue
+        topProducts(first: 2) { product { name } orderCount revenue }
+      }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        make_orders(3)
+        Customer.objects.create(name="No orders", email="idle@example.com")
+
+    def test_aggregates_in_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(4):
+            stats = self.graphql(self.QUERY)["data"]["crmStats"]
+        self.assertEqual(
+            (stats["customerCount"], stats["activeCustomerCount"], stats["orderCount"]), (4, 3, 3)
+        )
+        self.assertEqual(Decimal(stats["revenue"]), Decimal("89.91"))
+        self.assertEqual(Decimal(stats["averageOrderValue"]), Decimal("29.97"))
+        self.assertEqual(
+            stats["topProducts"],
+            [
+                {"product": {"name": "Product 0"}, "orderCount": 3, "revenue": "29.97"},
+                {"product": {"name": "Product 1"}, "orderCount": 3, "revenue": "29.97"},
+            ],
+        )
+
+    def test_product_filter_counts_each_order_once(self):
+        result = self.graphql(self.QUERY, {"filter": {"productName": "Product"}})
+        stats = result["data"]["crmStats"]
+        self.assertEqual(stats["orderCount"], 3)
+        self.assertEqual(Decimal(stats["revenue"]), Decimal("89.91"))
+
+
+class DailyRollupTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    {
+      crmReport {
+        newCustomers orderCount revenue
+        days { day orderCount revenue }
+        topProducts(first: 1) { product { name } units revenue }
+      }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        make_orders(4)
+        now = timezone.now()
+        orders = list(Order.objects.order_by("pk"))
+        # Two orders three days ago, one yesterday, one today
+        for order, days_ago in zip(orders, (3, 3, 1, 0)):
+            Order.objects.filter(pk=order.pk).update(order_date=now - timedelta(days=days_ago))
+        Customer.objects.update(created_at=now - timedelta(days=3))
+
+    def test_catch_up_folds_finished_days_once(self):
+        self.assertEqual(catch_up(), 3)
+        rollups = list(DailyCrmRollup.objects.values_list("order_count", "new_customers"))
+        self.assertEqual(rollups, [(2, 4), (0, 0), (1, 0)])
+        self.assertEqual(DailyProductRollup.objects.filter(units=2).count(), 3)
+        self.assertEqual(catch_up(), 0)
+        # Re-folding the last day replaces its rows instead of adding to them
+        self.assertEqual(catch_up(refresh_days=1), 1)
+        self.assertEqual(DailyCrmRollup.objects.count(), 3)
+
+    def test_report_reads_rollups_plus_today(self):
+        catch_up()
+        # Fixed however many orders exist: only today's are read from crm_order
+        with self.assertNumQueries(7):
+            report = self.graphql(self.QUERY)["data"]["crmReport"]
+        self.assertEqual((report["newCustomers"], report["orderCount"]), (4, 4))
+        self.assertEqual(Decimal(report["revenue"]), Decimal("119.88"))
+        self.assertEqual([day["orderCount"] for day in report["days"]], [2, 0, 1])
+        self.assertEqual(
+            report["topProducts"],
+            [{"product": {"name": "Product 0"}, "units": 3, "revenue": "29.97"}],
+        )
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        make_orders(3)
+        self.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.staff.user_permissions.add(*Permission.objects.filter(
+            content_type__app_label="crm", codename__in=["view_order", "view_customer", "view_product"],
+        ))
+        self.client.force_login(self.staff)
+
+    def test_needs_staff_with_view_permission(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/export/customers.csv").status_code, 403)
+        clerk = User.objects.create_user("clerk", is_staff=False)
+        self.client.force_login(clerk)
+        self.assertEqual(self.client.get("/export/customers.csv").status_code, 403)
+        self.staff.user_permissions.remove(Permission.objects.get(codename="view_customer"))
+        self.client.force_login(User.objects.get(pk=self.staff.pk))
+        self.assertEqual(self.client.get("/export/orders.csv").status_code, 403)
+        self.assertEqual(self.client.get("/export/products.csv").status_code, 200)
+
+    def test_streams_filtered_orders_as_csv_once_each(self):
+        response = self.client.get(
+            "/export/orders.csv", {"filter": json.dumps({"productName": "Product"})}
+        )
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,customer_id,customer_email,status,total_amount,order_date")
+        self.assertEqual(len(lines), 4)
+        self.assertIn(",c0@example.com,PENDING,29.97,", lines[1])
+
+    def test_ndjson_command_uses_the_customer_filter(self):
+        out = StringIO()
+        call_command(
+            "export_crm", "customers", "--format", "ndjson",
+            "--filter", '{"emailIcontains": "c1@"}', stdout=out,
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row["email"] for row in rows], ["c1@example.com"])
+
+    def test_rejects_filters_that_do_not_fit_the_input_type(self):
+        response = self.client.get("/export/products.csv", {"filter": '{"stockGte": "many"}'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/export/invoices.csv").status_code, 404)
+
+
+class InactiveCustomerCleanupTests(TestCase):
+    def setUp(self):
+        make_orders(1)
+        for i in range(5):
+            Customer.objects.create(name=f"Idle {i}", email=f"idle{i}@example.com")
+        Customer.objects.update(created_at=timezone.now() - timedelta(days=400))
+
+    def test_dry_run_then_batched_delete(self):
+        self.assertEqual(clean_inactive_customers(batch_size=2, sleep=0, dry_run=True), 5)
+        self.assertEqual(Customer.objects.count(), 6)
+
+        batches = []
+        total = clean_inactive_customers(
+            batch_size=2, sleep=0, progress=lambda total, pk: batches.append(total)
+        )
+        self.assertEqual((total, batches), (5, [2, 4, 5]))
+        self.assertEqual(list(Customer.objects.values_list("email", flat=True)), ["c0@example.com"])
+        self.assertFalse(JobCheckpoint.objects.filter(name=CHECKPOINT_NAME).exists())
+
+    def test_resumes_after_the_checkpoint(self):
+        idle = list(Customer.objects.filter(name__startswith="Idle").order_by("pk"))
+        JobCheckpoint.objects.create(name=CHECKPOINT_NAME, position=idle[2].pk)
+        self.assertEqual(clean_inactive_customers(sleep=0), 2)
+        self.assertEqual(clean_inactive_customers(sleep=0, resume=False), 3)
+
+    def test_interrupted_run_resumes_in_a_new_process(self):
+        def crash(total, last_pk):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            clean_inactive_customers(batch_size=2, sleep=0, progress=crash)
+        # A retry runs in a fresh process: nothing survives in local memory
+        cache.clear()
+        self.assertEqual(Customer.objects.count(), 4)
+        batches = []
+        total = clean_inactive_customers(
+            batch_size=2, sleep=0, progress=lambda total, pk: batches.append(total)
+        )
+        self.assertEqual((total, batches), (3, [2, 3]))
+        self.assertEqual(Customer.objects.count(), 1)
+
+
+class OrderReminderTests(GraphQLTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        make_orders(3)
+        self.reminders = load_script(REMINDERS_SCRIPT)
+        Order.objects.filter(pk=Order.objects.order_by("pk").last().pk).update(
+            status=Order.Status.COMPLETED
+        )
+
+    def pending_page(self, first=1):
+        since = (timezone.now() - timedelta(days=7)).isoformat()
+        result = self.graphql(self.reminders.PENDING_ORDERS_QUERY, {"since": since, "first": first})
+        return [edge["node"]["id"] for edge in result["data"]["allOrders"]["edges"]]
+
+    def test_pages_through_pending_orders_marking_them_reminded(self):
+        seen = []
+        while page := self.pending_page():
+            seen += page
+            result = self.graphql(self.reminders.MARK_REMINDED_MUTATION, {"ids": page})
+            self.assertEqual(result["data"]["markOrdersReminded"]["updatedCount"], 1)
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(Order.objects.filter(reminded_at__isnull=False).count(), 2)
+        # Reminding again is a no-op
+        result = self.graphql(self.reminders.MARK_REMINDED_MUTATION, {"ids": seen})
+        self.assertEqual(result["data"]["markOrdersReminded"]["updatedCount"], 0)
+
+    def test_rejects_ids_of_other_types(self):
+        product_id = to_global_id("ProductType", Product.objects.first().pk)
+        result = self.graphql(self.reminders.MARK_REMINDED_MUTATION, {"ids": [product_id]})
+        self.assertIn("Not an order ID", result["errors"][0]["message"])
+
+
+class ResolverTimingTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    { allOrders(first: 5) { totalCount edges { node { totalAmount product { name } } } } }
+    """
+
+    def test_debug_header_adds_per_path_timings(self):
+        make_orders(3)
+        response = self.client.post(
+            "/graphql",
+            json.dumps({"query": self.QUERY}),
+            content_type="application/json",
+            HTTP_X_GRAPHQL_DEBUG="1",
+        )
+        timing = response.json()["extensions"]["timing"]
+        self.assertEqual(timing["allOrders"]["calls"], 1)
+        # The page and its products are read inside the connection resolver
+        self.assertGreaterEqual(timing["allOrders"]["sql"], 2)
+        product = timing["allOrders.edges.node.product"]
+        self.assertEqual((product["calls"], product["sql"]), (3, 0))
+        self.assertNotIn("allOrders.edges.node.totalAmount", timing)
+
+        self.assertNotIn("timing", self.graphql(self.QUERY).get("extensions", {}))
+
+    def test_metrics_endpoint_exposes_histograms(self):
+        self.graphql(self.QUERY)
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn("# TYPE crm_graphql_resolver_duration_seconds histogram", body)
+        self.assertIn('crm_graphql_resolver_sql_queries_count{field="Query.allOrders"}', body)
+        self.assertIn("crm_graphql_document_cache_hits_total", body)
+
+    def test_metric_labels_ignore_aliases(self):
+        make_orders(1)
+        self.graphql("{ a1: allOrders { totalCount } a2: allOrders { totalCount } }")
+        body = self.client.get("/metrics").content.decode()
+        self.assertNotIn("a1", body)
+        self.assertIn('crm_graphql_resolver_duration_seconds_count{field="Query.allOrders"}', body)
+
+
+@override_settings(CRM_SHARED_CACHE=True)
+class ResponseCacheTests(GraphQLTestMixin, TestCase):
+    PRODUCTS = """
+    query ($first: Int) { allProducts(first: $first) { edges { node { name stock } } } }
+    """
+
+    def post(self, query, variables=None):
+        result = self.graphql(query, variables)
+        return result["data"], result["extensions"].get("responseCache")
+
+    def test_repeats_are_served_from_cache_until_a_write(self):
+        Product.objects.create(name="Low", price=Decimal("1.00"), stock=2)
+        self.assertEqual(self.post(self.PRODUCTS, {"first": 5})[1], "miss")
+        with self.assertNumQueries(0):
+            data, status = self.post(self.PRODUCTS, {"first": 5})
+        self.assertEqual((status, data["allProducts"]["edges"][0]["node"]["stock"]), ("hit", 2))
+        # Variables are part of the key
+        self.assertEqual(self.post(self.PRODUCTS, {"first": 1})[1], "miss")
+
+        # updateLowStockProducts writes with update(), which skips post_save
+        self.graphql("mutation { updateLowStockProducts { updatedCount } }")
+        data, status = self.post(self.PRODUCTS, {"first": 5})
+        self.assertEqual((status, data["allProducts"]["edges"][0]["node"]["stock"]), ("miss", 12))
+
+    def test_filters_on_related_models_are_invalidated_by_them(self):
+        make_orders(1)
+        query = '{ allOrders(filter: {customerName: "Customer"}) { totalCount } }'
+        self.assertEqual(self.post(query)[0]["allOrders"]["totalCount"], 1)
+        self.assertEqual(self.post(query)[1], "hit")
+        Customer.objects.update(name="Renamed")
+        Customer.objects.get().save()
+        self.assertEqual(self.post(query), ({"allOrders": {"totalCount": 0}}, "miss"))
+
+    @override_settings(CRM_SHARED_CACHE=None)
+    def test_off_with_a_per_process_cache(self):
+        # The test settings use LocMemCache, which other workers can't see
+        for _ in range(2):
+            result = self.graphql(self.PRODUCTS, {"first": 5})
+            self.assertNotIn("responseCache", result.get("extensions", {}))
+        self.assertEqual(entity_cache.ttl, 0)
+
+
+@override_settings(CRM_RESPONSE_CACHE_TTL=0, CRM_SHARED_CACHE=True)
+class EntityCacheTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    query ($ids: [ID!]!) { nodes(ids: $ids) { ... on ProductType { name stock } } }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.products = [
+            Product.objects.create(name=f"P{i}", price=Decimal("1.00"), stock=i) for i in range(3)
+        ]
+        self.ids = [to_global_id("ProductType", p.pk) for p in self.products]
+
+    def names(self, ids=None):
+        result = self.graphql(self.QUERY, {"ids": ids or self.ids})
+        return [node and node["name"] for node in result["data"]["nodes"]]
+
+    def test_page_of_nodes_is_one_query_then_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names(), ["P0", "P1", "P2"])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ["P0", "P1", "P2"])
+
+        self.products[1].name = "Renamed"
+        self.products[1].save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.names(), ["P0", "Renamed", "P2"])
+        # Only the saved product was read again
+        self.assertEqual(len(queries), 1)
+        self.assertIn(f"IN ({self.products[1].pk})", queries.captured_queries[0]["sql"])
+
+    def test_update_mutations_retire_the_whole_model(self):
+        self.names()
+        self.graphql("mutation { updateLowStockProducts { updatedCount } }")
+        with self.assertNumQueries(1):
+            result = self.graphql(self.QUERY, {"ids": self.ids})
+        self.assertEqual([node["stock"] for node in result["data"]["nodes"]], [10, 11, 12])
+
+    def test_single_node_and_missing_ids(self):
+        missing = to_global_id("ProductType", 999999)
+        self.assertEqual(self.names([self.ids[0], missing]), ["P0", None])
+        result = self.graphql(
+            "query ($id: ID!) { node(id: $id) { ... on ProductType { name } } }", {"id": self.ids[2]}
+        )
+        self.assertEqual(result["data"]["node"]["name"], "P2")
+
+    def test_malformed_ids_are_null_in_their_slot(self):
+        bad_pk = to_global_id("CustomerType", "abc")
+        bad_type = to_global_id("NopeType", 1)
+        ids = [self.ids[0], bad_pk, bad_type, "not-base64!", self.ids[1]]
+        self.assertEqual(self.names(ids), ["P0", None, None, None, "P1"])
+
+
+class SearchTests(GraphQLTestMixin, TestCase):
+    QUERY = """
+    query ($q: String!, $types: [SearchKind!], $first: Int, $after: String) {
+      search(query: $q, types: $types, first: $first, after: $after) {
+        edges { rank node { __typename ... on CustomerType { name } ... on ProductType { name } } }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.ada = Customer.objects.create(name="Ada Lovelace", email="ada@analytical.org")
+        Customer.objects.create(name="Adam Smith", email="adam@example.com")
+        Customer.objects.create(name="Grace Hopper", email="grace@example.com")
+        self.adapter = Product.objects.create(name="Adapter cable", price=Decimal("4.00"))
+        Product.objects.create(name="Laptop", price=Decimal("900.00"))
+
+    def search(self, q, **variables):
+        result = self.graphql(self.QUERY, {"q": q, **variables})
+        self.assertNotIn("errors", result)
+        return result["data"]["search"]
+
+    def names(self, q, **variables):
+        return sorted(edge["node"]["name"] for edge in self.search(q, **variables)["edges"])
+
+    def test_prefix_match_across_types_ranked(self):
+        with self.assertNumQueries(3):
+            # one index query, then one query per type for the objects
+            data = self.search("ada")
+        self.assertEqual(
+            sorted((e["node"]["__typename"], e["node"]["name"]) for e in data["edges"]),
+            [("CustomerType", "Ada Lovelace"), ("CustomerType", "Adam Smith"),
+             ("ProductType", "Adapter cable")],
+        )
+        ranks = [edge["rank"] for edge in data["edges"]]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        # Every word must match; e-mails are split into words
+        self.assertEqual(self.names("ada love"), ["Ada Lovelace"])
+        self.assertEqual(self.names("analytical"), ["Ada Lovelace"])
+        self.assertEqual(self.names("ada", types=["PRODUCT"]), ["Adapter cable"])
+        # FTS syntax in the input is just more words, never an error
+        self.assertEqual(self.names('"ada" OR NEAR('), [])
+
+    def test_pages_forward(self):
+        first = self.search("ada", first=2)
+        self.assertTrue(first["pageInfo"]["hasNextPage"])
+        rest = self.search("ada", first=2, after=first["pageInfo"]["endCursor"])
+        self.assertFalse(rest["pageInfo"]["hasNextPage"])
+        seen = [e["node"]["name"] for e in first["edges"] + rest["edges"]]
+        self.assertEqual(sorted(seen), ["Ada Lovelace", "Adam Smith", "Adapter cable"])
+
+    def test_index_follows_writes(self):
+        self.adapter.name = "USB hub"
+        self.adapter.save()
+        self.ada.delete()
+        self.graphql(
+            "mutation ($input: [CustomerInput!]!) { bulkCreateCustomers(input: $input) { errors } }",
+            {"input": [{"name": "Adah Isaacs", "email": "adah@example.com"}]},
+        )
+        self.assertEqual(self.names("ada"), ["Adah Isaacs", "Adam Smith"])
+        self.assertEqual(self.names("usb"), ["USB hub"])
+
+    def test_rebuild_command(self):
+        Product.objects.filter(pk=self.adapter.pk).update(name="Hub")
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertIn("Indexed 5 rows", out.getvalue())
+        self.assertEqual(self.names("hub"), ["Hub"])
+
+
+class LocalExecutionTests(TestCase):
+    def test_job_operations_run_in_process(self):
+        Product.objects.create(name="Low", price=Decimal("1.00"), stock=2)
+        self.assertEqual(execute_local(cron.HEARTBEAT_QUERY), {"hello": "Hello, GraphQL!"})
+
+        data = execute_local(cron.LOW_STOCK_MUTATION)["updateLowStockProducts"]
+        self.assertEqual(data["updatedProducts"], [{"name": "Low", "stock": 12}])
+        self.assertEqual(execute_local(tasks.REPORT_QUERY)["crmReport"]["orderCount"], 0)
+
+    def test_weekly_report_reads_rollups_refolded_on_delete(self):
+        make_orders(2)
+        catch_up(until=timezone.localdate() + timedelta(days=1))
+        # Deleting orders refolds their (already rolled-up) day
+        Customer.objects.get(email="c1@example.com").delete()
+        self.assertEqual(DailyCrmRollup.objects.get(day=timezone.localdate()).order_count, 1)
+        log = mock.mock_open()
+        with mock.patch("crm.tasks.open", log, create=True):
+            tasks.generate_crm_report()
+        line = log().write.call_args[0][0]
+        self.assertTrue(line.endswith("Report: 1 customers, 1 orders, 29.97 revenue\n"), line)
+
+    def test_errors_are_raised(self):
+        with self.assertRaisesMessage(LocalExecutionError, "Cannot query field 'nope'"):
+            execute_local("{ nope }")
+        with self.assertRaisesMessage(LocalExecutionError, "Threshold cannot be negative"):
+            execute_local("mutation { updateLowStockProducts(threshold: -1) { success } }")
+
+
+class FilterIndexTests(TestCase):
+    """EXPLAIN the common filters and make sure none of them scans the table.
+
+    phone__startswith and the icontains lookups are left out: SQLite's LIKE is
+    case-insensitive and can't use a plain index (Postgres gets pattern_ops and
+    trigram indexes in migration 0004).
+    """
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        self.assertNotRegex(plan, rf"SCAN (TABLE )?{table}(?! USING)", plan)
+        self.assertIn("INDEX", plan)
+
+    def test_common_filters_use_indexes(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("plan assertions are written against SQLite's EXPLAIN output")
+        now = timezone.now()
+        self.assertUsesIndex(Customer.objects.filter(created_at__gte=now))
+        self.assertUsesIndex(Customer.objects.filter(created_at__lte=now).order_by("-created_at"))
+        self.assertUsesIndex(Product.objects.filter(price__gte=1, price__lte=5))
+        self.assertUsesIndex(Product.objects.filter(stock__lt=10))
+        self.assertUsesIndex(Order.objects.filter(order_date__gte=now))
+        self.assertUsesIndex(Order.objects.filter(total_amount__gte=1))
+        self.assertUsesIndex(Order.objects.order_by("-order_date", "-id")[:10])
+        self.assertUsesIndex(Order.objects.filter(status="COMPLETED", order_date__gte=now))
+        self.assertUsesIndex(
+            Order.objects.filter(status="PENDING", reminded_at__isnull=True, order_date__gte=now)
+        )
+
+
+class QueryComplexityTests(GraphQLTestMixin, TestCase):
+    FAN_OUT = """
+    query ($n: Int) {
+      allOrders(first: $n) { edges { node {
+        customer { orders(first: $n) { edges { node {
+          products(first: $n) { edges { node { name } } }
+        } } } }
+      } } }
+    }
+    """
+
+    def test_cost_is_reported_in_extensions(self):
+        result = self.graphql(self.FAN_OUT, {"n": 2})
+        self.assertNotIn("errors", result)
+        # products 1 + 2 * (edges 1 + node 1) = 5
+        # orders 1 + 2 * (edges 1 + node 1 + products 5) = 15
+        # allOrders 2 + 2 * (edges 1 + node 1 + customer 1 + orders 15) = 38
+        self.assertEqual(result["extensions"]["cost"], {"cost": 38, "depth": 11})
+
+    def test_zero_or_negative_page_sizes_count_as_one(self):
+        one = self.graphql(self.FAN_OUT, {"n": 1})["extensions"]["cost"]["cost"]
+        for n in (0, -1000):
+            result = self.graphql(self.FAN_OUT, {"n": n})
+            self.assertEqual(result["extensions"]["cost"]["cost"], one)
+
+    def test_fan_out_over_budget_is_rejected_before_execution(self):
+        make_orders(1)
+        with self.assertNumQueries(0):
+            result = self.graphql(self.FAN_OUT, {"n": 100})
+        self.assertIn("exceeds the maximum of 25000", result["errors"][0]["message"])
+        self.assertNotIn("data", result)
+
+    def test_dashboard_and_unpaged_order_pages_fit_the_default_budget(self):
+        make_orders(2)
+        pages = (
+            "{ allOrders(first: 100) { edges { node {"
+            " customer { name } product { name } products { edges { node { name } } } } } } }",
+            "{ allOrders { edges { node {"
+            " customer { name } products { edges { node { name } } } } } } }",
+        )
+        for query in pages:
+            result = self.graphql(query)
+            self.assertNotIn("errors", result)
+            self.assertEqual(len(result["data"]["allOrders"]["edges"]), 2)
+
+    @override_settings(GRAPHENE={**settings.GRAPHENE, "RELAY_CONNECTION_MAX_LIMIT": 3})
+    def test_unpaged_connections_return_the_page_they_were_priced_at(self):
+        make_orders(5)
+        result = self.graphql("{ allOrders { pageInfo { hasNextPage } edges { node { id } } } }")
+        # allOrders 2 + 3 * (pageInfo 1 + edges 1 + node 1)
+        self.assertEqual(result["extensions"]["cost"]["cost"], 11)
+        self.assertEqual(len(result["data"]["allOrders"]["edges"]), 3)
+        self.assertTrue(result["data"]["allOrders"]["pageInfo"]["hasNextPage"])
+
+    @override_settings(CRM_GRAPHQL_MAX_DEPTH=10)
+    def test_depth_limit(self):
+        result = self.graphql(self.FAN_OUT, {"n": 1})
+        self.assertIn("Query depth 11 exceeds the maximum of 10", result["errors"][0]["message"])
+
+
+class PersistedQueryTests(GraphQLTestMixin, TestCase):
+    QUERY = "{ allProducts { totalCount } }"
+
+    def persisted(self, sha256, query=None):
+        body = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": sha256}}}
+        if query:
+            body["query"] = query
+        response = self.client.post("/graphql", json.dumps(body), content_type="application/json")
+        return response.json()
+
+    def test_register_then_execute_by_hash(self):
+        sha256 = query_hash(self.QUERY)
+        missing = self.persisted(sha256)
+        self.assertEqual(missing["errors"][0]["message"], "PersistedQueryNotFound")
+
+        self.assertEqual(self.persisted(sha256, self.QUERY)["data"]["allProducts"]["totalCount"], 0)
+        self.assertEqual(self.persisted(sha256)["data"]["allProducts"]["totalCount"], 0)
+
+    def test_rejects_mismatched_hash(self):
+        result = self.persisted("0" * 64, self.QUERY)
+        self.assertEqual(result["errors"][0]["message"], "provided sha does not match query")
+
+    def test_persistent_stores_are_not_written_by_clients(self):
+        store = CachedQueryStore(DatabaseQueryStore())
+        sha256 = query_hash(self.QUERY)
+        with mock.patch("crm.views.get_query_store", return_value=store):
+            # The query still runs; it just isn't registered
+            self.assertEqual(self.persisted(sha256, self.QUERY)["data"]["allProducts"]["totalCount"], 0)
+            self.assertFalse(PersistedQuery.objects.exists())
+            self.assertEqual(self.persisted(sha256)["errors"][0]["message"], "PersistedQueryNotFound")
+            with override_settings(CRM_PERSISTED_QUERY_AUTO_REGISTER=True):
+                self.persisted(sha256, self.QUERY)
+        self.assertTrue(PersistedQuery.objects.filter(sha256=sha256).exists())
+
+    def test_database_store_is_read_through_an_lru(self):
+        store = CachedQueryStore(DatabaseQueryStore())
+        sha256 = query_hash(self.QUERY)
+        self.assertIsNone(store.get(sha256))
+        store.set(sha256, self.QUERY)
+        with self.assertNumQueries(0):
+            self.assertEqual(store.get(sha256), self.QUERY)
+            store.set(sha256, self.QUERY)
+        # A fresh process reads it back from the table once
+        fresh = CachedQueryStore(DatabaseQueryStore())
+        with self.assertNumQueries(1):
+            fresh.get(sha256)
+            fresh.get(sha256)
+
+
+class DocumentCacheTests(TestCase):
+    def test_hits_skip_parsing_and_evict_by_size(self):
+        cache = DocumentCache(max_size=60)
+        graphql_schema = schema.graphql_schema
+        first = "{ allProducts { totalCount } }"
+        second = "{ allCustomers { totalCount } }"
+
+        document, errors = cache.get(graphql_schema, first)
+        self.assertEqual(errors, [])
+        self.assertIs(cache.get(graphql_schema, first)[0], document)
+
+        cache.get(graphql_schema, second)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        # Both texts together exceed 60 characters, so the older one went
+        self.assertEqual((stats["entries"], stats["evictions"]), (1, 1))
+
+    def test_validation_errors_are_cached_too(self):
+        cache = DocumentCache()
+        _, errors = cache.get(schema.graphql_schema, "{ nope }")
+        self.assertEqual(len(errors), 1)
+        self.assertIs(cache.get(schema.graphql_schema, "{ nope }")[1], errors)
+
+
+class AsyncGraphQLViewTests(TestCase):
+    async def test_async_endpoint_executes_and_reports_cost(self):
+        body = json.dumps({"query": "{ allProducts { totalCount } }"})
+        response = await self.async_client.post(
+            "/graphql/async", body, content_type="application/json"
+        )
+        result = json.loads(response.content)
+        self.assertEqual(result["data"]["allProducts"]["totalCount"], 0)
+        self.assertIn("cost", result["extensions"])
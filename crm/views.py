@@ -1,3 +1,279 @@
-from django.shortcuts import render
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-# Create your views here.
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotAllowed,
+    StreamingHttpResponse,
+)
+from django.http.response import HttpResponseBadRequest
+from django.views.decorators.http import require_GET
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    validate_schema,
+)
+from graphql.validation import validate
+
+from .complexity import complexity_rule
+from .document_cache import document_cache
+from .export import EXPORTS, FORMATS, export_rows, may_export, parse_filter, render
+from .instrumentation import debug_requested, render_metrics, timing_report
+from .persisted import auto_register, get_query_store, query_hash
+from .response_cache import response_cache
+
+# Threads executing GraphQL operations for AsyncCRMGraphQLView
+DEFAULT_ASYNC_WORKERS = 8
+
+
+class CRMGraphQLView(GraphQLView):
+    """GraphQLView with a cost/depth budget, persisted queries and a document cache.
+
+    The computed cost is returned under `extensions.cost` in every response,
+    and per-resolver timings under `extensions.timing` when the request sends
+    the debug header (see crm.instrumentation).
+    Clients can send `extensions.persistedQuery.sha256Hash` instead of (or
+    along with, to register it where persisted.auto_register allows) the
+    query text, Apollo APQ style. Parsed and
+    validated documents are reused across requests via `document_cache`, and
+    query results via `response_cache`.
+    """
+
+    # ---------------- Persisted queries ----------------
+    def get_persisted_hash(self, request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted = (extensions or {}).get("persistedQuery")
+        if not persisted:
+            return None
+        sha256 = str(persisted.get("sha256Hash") or "").lower()
+        if not sha256:
+            raise GraphQLError("persistedQuery needs a sha256Hash")
+        return sha256
+
+    def resolve_persisted_query(self, sha256, query):
+        store = get_query_store()
+        if query:
+            if query_hash(query) != sha256:
+                raise GraphQLError("provided sha does not match query")
+            if auto_register(store):
+                store.set(sha256, query)
+            return query
+        query = store.get(sha256)
+        if query is None:
+            raise GraphQLError(
+                "PersistedQueryNotFound",
+                extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+            )
+        return query
+
+    # ---------------- Execution ----------------
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        # Django builds a view instance per request; only batch mode reuses it
+        self.extensions = {}
+        schema = self.schema.graphql_schema
+
+        try:
+            sha256 = self.get_persisted_hash(request, data)
+            if sha256 is not None:
+                query = self.resolve_persisted_query(sha256, query)
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            document, validation_errors = document_cache.get(schema, query)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        # The cost depends on the variables, so it's checked on every request
+        cost = {}
+        validation_errors = validate(schema, document, [complexity_rule(variables, cost)])
+        if cost:
+            self.extensions["cost"] = cost
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        # Read-only operations may be answered from the response cache; debug
+        # requests always execute so their timings are real
+        cache_key = None
+        if (
+            operation_ast is not None
+            and operation_ast.operation == OperationType.QUERY
+            and not debug_requested(request)
+        ):
+            cache_key = response_cache.key(schema, document, query, operation_name, variables)
+            cached = response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                self.extensions["responseCache"] = "hit"
+                return ExecutionResult(data=cached)
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            # ResolverTimingMiddleware sums per-path figures into this
+            if debug_requested(request):
+                request.crm_timing = {}
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+            else:
+                result = execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+        timing = getattr(request, "crm_timing", None)
+        if timing is not None:
+            self.extensions["timing"] = timing_report(timing)
+        if cache_key and result.data is not None and not result.errors:
+            response_cache.set(cache_key, result.data)
+            self.extensions["responseCache"] = "miss"
+        return result
+
+    def json_encode(self, request, d, pretty=False):
+        extensions = getattr(self, "extensions", None)
+        if extensions:
+            d = {**d, "extensions": extensions}
+            self.extensions = {}
+        return super().json_encode(request, d, pretty)
+
+
+# ---------------- ASGI ----------------
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def graphql_executor():
+    """Bounded pool the async view runs GraphQL operations in, one per process."""
+    global _executor
+    if _executor is None:
+        # Two first requests at once must not each build a pool
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "CRM_GRAPHQL_ASYNC_WORKERS", DEFAULT_ASYNC_WORKERS),
+                    thread_name_prefix="crm-graphql",
+                )
+    return _executor
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """Async flavour of CRMGraphQLView for the ASGI application.
+
+    The resolvers are synchronous ORM code, so each operation is executed by
+    graphql-core in a bounded worker pool. The event loop only waits on it,
+    which lets a slow report hold a pool thread without holding a worker.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            graphql_executor(), partial(self.dispatch_in_worker, request, *args, **kwargs)
+        )
+
+    def dispatch_in_worker(self, request, *args, **kwargs):
+        # Pool threads outlive requests, so apply CONN_MAX_AGE like a request would
+        close_old_connections()
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            close_old_connections()
+
+
+# ---------------- Export ----------------
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+@require_GET
+def export_view(request, name, fmt):
+    """Stream every matching order/customer/product as CSV or NDJSON.
+
+    `?filter=` takes the same JSON as the GraphQL <Model>FilterInput.
+    Only staff users with view permission on the exported models get it.
+    """
+    if name not in EXPORTS or fmt not in FORMATS:
+        raise Http404(f"No export {name}.{fmt}")
+    if not may_export(request.user, name):
+        return HttpResponseForbidden("Exports need a staff account with view permission.")
+    try:
+        filter = parse_filter(name, request.GET.get("filter"))
+    except ValueError as e:
+        return HttpResponseBadRequest(f"Invalid filter: {e}")
+
+    columns, rows = export_rows(name, filter)
+    response = StreamingHttpResponse(render(columns, rows, fmt), content_type=CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+# ---------------- Metrics ----------------
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint for this process's resolver histograms."""
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4")
@@ -2,10 +2,11 @@ import graphene
 from graphene_django import DjangoObjectType
 from django.db import transaction
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from django.utils import timezone
 from graphql import GraphQLError
 
+from crm.inventory import place_order
 from crm.models import Customer, Product, Order
+from crm.schema import to_pk
 
 
 # ---------------- GraphQL Types (Relay-Compatible) ----------------
@@ -193,20 +194,10 @@ class CreateOrder(graphene.Mutation):
             except ObjectDoesNotExist:
                 raise GraphQLError("Invalid customer ID") from None
 
-            products = Product.objects.filter(pk__in=input.product_ids)
-            if not products.exists():
-                raise GraphQLError("No valid products found")
-            if products.count() != len(set(map(str, input.product_ids))):
-                # If any product id is invalid, count will differ
-                raise GraphQLError("Some product IDs are invalid")
-
-            order = Order.objects.create(
-                customer=customer,
-                order_date=input.order_date or timezone.now(),
-                total_amount=sum([p.price for p in products])
-            )
-            order.products.set(products)
-            order.save()
+            # One unit of each product, through the same code as crm.schema's
+            # createOrder: locked stock, captured prices, SQL total, stats
+            quantities = dict.fromkeys(map(to_pk, input.product_ids), 1)
+            order, _ = place_order(customer, quantities, input.order_date)
             return CreateOrder(order=order)
         except Exception as e:
             raise GraphQLError(f"Failed to create order: {str(e)}") from None